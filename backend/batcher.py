@@ -0,0 +1,109 @@
+import asyncio
+import time
+from collections import Counter
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row predictions into one model call.
+
+    Requests arriving within max_wait_ms of the first one (or until max_batch rows are
+    collected) are stacked and sent to `run_batch` together. `run_batch` is an async
+    callable taking the list of items and returning (results, timings), with one result
+    per item in the same order (e.g. InferenceExecutor.run bound to predict_rows).
+    """
+
+    def __init__(self, run_batch, max_wait_ms=3.0, max_batch=32):
+        self.run_batch = run_batch
+        self.max_wait_ms = max_wait_ms
+        self.max_batch = max_batch
+
+        # Only touched from the event loop thread
+        self._items = []
+        self._waiters = []
+        self._opened_at = None
+        self._timer = None
+        self._tasks = set()
+
+        self.batches = 0
+        self.rows = 0
+        self.size_histogram = Counter()
+
+    async def submit(self, item):
+        """Returns (result, timings) for a single item once its batch has been scored."""
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+
+        if not self._items:
+            self._opened_at = time.time()
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        self._items.append(item)
+        self._waiters.append(waiter)
+
+        if len(self._items) >= self.max_batch:
+            self._flush()
+
+        return await waiter
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._items:
+            return
+
+        items, waiters, opened_at = self._items, self._waiters, self._opened_at
+        self._items, self._waiters, self._opened_at = [], [], None
+
+        task = asyncio.get_running_loop().create_task(self._run(items, waiters, opened_at))
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, items, waiters, opened_at):
+        batch_wait_ms = round((time.time() - opened_at) * 1000, 3)
+        self.batches += 1
+        self.rows += len(items)
+        self.size_histogram[_bucket(len(items))] += 1
+
+        try:
+            try:
+                results, timings = await self.run_batch(items)
+            except Exception as e:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                return
+
+            timings = {"batch_wait_ms": batch_wait_ms, **timings, "batch_size": len(items)}
+            for waiter, result in zip(waiters, results):
+                if not waiter.done():
+                    waiter.set_result((result, timings))
+        finally:
+            # Cancelled batch (CancelledError is not an Exception) or fewer results than
+            # items: the callers still waiting are cancelled instead of hanging forever
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.cancel()
+
+    def stats(self):
+        return {
+            "max_wait_ms": self.max_wait_ms,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": {k: self.size_histogram[k] for k in sorted(self.size_histogram, key=_bucket_order)},
+        }
+
+
+def _bucket(size):
+    # Power-of-two buckets: "1", "2", "3-4", "5-8", ...
+    if size <= 2:
+        return str(size)
+    upper = 1 << (size - 1).bit_length()
+    return f"{upper // 2 + 1}-{upper}"
+
+
+def _bucket_order(label):
+    return int(label.split("-")[-1])
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with TTL for model predictions.
+    Entries are tagged with the model version they were computed with, so the
+    whole cache is dropped as soon as a different model version asks for it.
+    """
+
+    def __init__(self, max_size=4096, ttl_seconds=3600.0, coord_precision=4):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.coord_precision = coord_precision
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def make_key(self, data):
+        """
+        Canonical form of a PropertyData: fields in a fixed order, enums by value
+        and lat/lon quantized (4 decimals ~ 11 m), so near-identical payloads share an entry.
+        """
+        values = []
+        for name, value in sorted(data.model_dump().items()):
+            if name in ('latitude', 'longitude'):
+                value = round(float(value), self.coord_precision)
+            elif hasattr(value, 'value'):
+                value = value.value
+            elif isinstance(value, float):
+                value = round(value, 6)
+            values.append((name, value))
+        return tuple(values)
+
+    def _check_version(self, version):
+        # Called with the lock held
+        if version != self._version:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self._version = version
+
+    def get(self, key, version):
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._check_version(version)
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version):
+        if not self.enabled:
+            return
+        with self._lock:
+            # A result computed by a version that is no longer active is just dropped
+            if version != self._version:
+                return
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "coord_precision": self.coord_precision,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "model_version": self._version,
+            }
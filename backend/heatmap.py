@@ -0,0 +1,57 @@
+import base64
+import math
+import numpy as np
+from preprocessing import EARTH_RADIUS_KM
+
+# Default bounding box: the city of Madrid
+MADRID_BBOX = {'min_lat': 40.312, 'min_lon': -3.889, 'max_lat': 40.643, 'max_lon': -3.518}
+
+
+def grid_shape(min_lat, min_lon, max_lat, max_lon, resolution_m):
+    """
+    (n_lat, n_lon) cells of ~resolution_m meters over the bounding box.
+    Plain arithmetic: the cell limit is checked before any array is allocated.
+    """
+    mid_lat = math.radians((min_lat + max_lat) / 2)
+    height_m = math.radians(max_lat - min_lat) * EARTH_RADIUS_KM * 1000
+    width_m = math.radians(max_lon - min_lon) * EARTH_RADIUS_KM * 1000 * math.cos(mid_lat)
+
+    n_lat = max(math.ceil(height_m / resolution_m), 1)
+    n_lon = max(math.ceil(width_m / resolution_m), 1)
+    return n_lat, n_lon
+
+
+def make_grid(min_lat, min_lon, max_lat, max_lon, resolution_m):
+    """
+    Cell centers of a regular grid over the bounding box, with cells of ~resolution_m meters.
+    Returns (lat_centers, lon_centers), each sorted ascending.
+    """
+    n_lat, n_lon = grid_shape(min_lat, min_lon, max_lat, max_lon, resolution_m)
+
+    lat_step = (max_lat - min_lat) / n_lat
+    lon_step = (max_lon - min_lon) / n_lon
+    lat_centers = min_lat + lat_step * (np.arange(n_lat) + 0.5)
+    lon_centers = min_lon + lon_step * (np.arange(n_lon) + 0.5)
+    return lat_centers, lon_centers
+
+
+def encode_uint16(prices):
+    """
+    Quantizes a price surface into uint16 (little endian, base64).
+    Decode with: price = offset + value * scale (65535 = no data).
+    """
+    prices = np.asarray(prices, dtype=float)
+    valid = np.isfinite(prices)
+    offset = float(prices[valid].min()) if valid.any() else 0.0
+    top = float(prices[valid].max()) if valid.any() else 0.0
+    scale = (top - offset) / 65534 if top > offset else 1.0
+
+    quantized = np.full(prices.shape, 65535, dtype='<u2')
+    quantized[valid] = np.round((prices[valid] - offset) / scale).astype('<u2')
+    return {
+        "encoding": "uint16-base64",
+        "offset": offset,
+        "scale": scale,
+        "nodata": 65535,
+        "data": base64.b64encode(quantized.tobytes()).decode(),
+    }
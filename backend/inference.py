@@ -0,0 +1,89 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the inference queue is already holding its maximum of jobs."""
+
+
+def _timed_call(fn, args):
+    # Runs inside the worker: wall-clock timestamps so they are comparable across processes
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time()
+
+
+class InferenceExecutor:
+    """
+    Runs CPU-bound inference (translator + model.predict) outside the asyncio event loop.
+
+    kind="thread" uses a ThreadPoolExecutor (sklearn/LightGBM/XGBoost release the GIL in
+    their hot loops). kind="process" forks a ProcessPoolExecutor: the model loaded in the
+    parent is inherited by the children, so `fn` must be a module-level function.
+    At most max_workers + max_queue jobs are accepted at the same time, the rest are rejected.
+    """
+
+    def __init__(self, kind="thread", max_workers=2, max_queue=64):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+
+        self._pool = self._new_pool()
+
+        # Only touched from the event loop thread, no lock needed
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _new_pool(self):
+        if self.kind == "process":
+            return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("fork"))
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+
+    def reset(self):
+        """
+        Replaces a process pool so new jobs are forked from the current parent state
+        (e.g. after a model swap). Jobs already submitted finish on the old pool.
+        Threads share the parent's memory, so a thread pool is left as it is.
+        """
+        if self.kind == "process":
+            old_pool, self._pool = self._pool, self._new_pool()
+            old_pool.shutdown(wait=False)
+
+    async def run(self, fn, *args):
+        """Returns (result, timings) where timings splits queueing time from compute time."""
+        if self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"Inference queue full ({self._pending} jobs pending)")
+
+        self._pending += 1
+        submitted = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started, finished = await loop.run_in_executor(self._pool, _timed_call, fn, args)
+        finally:
+            self._pending -= 1
+        self.completed += 1
+
+        timings = {
+            "queue_ms": round(max(started - submitted, 0.0) * 1000, 3),
+            "compute_ms": round((finished - started) * 1000, 3),
+        }
+        return result, timings
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
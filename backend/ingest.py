@@ -0,0 +1,173 @@
+"""
+Columnar cached ingest of the raw Inside Airbnb listings.csv.
+
+Only the columns that survive clean_airbnb_data are parsed (the free text of COLUMNS_TO_DROP
+is skipped), with explicit dtypes. The result is cached as Parquet next to the CSV and
+reused while the CSV content (SHA-1) doesn't change.
+
+Usage:
+    from ingest import load_listings
+    df_raw = load_listings('../data/listings.csv')
+
+Check that the model features match the ones built from pd.read_csv:
+    python ingest.py --verify ../data/listings.csv
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from preprocessing import COLUMNS_TO_DROP, REVIEW_DATES, clean_airbnb_data, prepare_for_modeling
+
+try:
+    import pyarrow  # noqa: F401  (Parquet engine of pandas)
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# ==========================================
+# 📊 INGEST SCHEMA (CONFIGURATION)
+# ==========================================
+CATEGORICAL_COLUMNS = ['room_type', 'neighbourhood_group_cleansed']
+DATE_COLUMNS = ['host_since', 'first_review', 'last_review']
+DATE_FORMAT = 'ISO8601'  # Inside Airbnb dates: YYYY-MM-DD
+
+# Bump it when the schema above changes: old caches are not reused
+INGEST_VERSION = 1
+
+
+def file_hash(path, block_size=1 << 20) -> str:
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def read_listings_csv(csv_path) -> pd.DataFrame:
+    """Pruned and typed read of listings.csv (no cache)."""
+    header = pd.read_csv(csv_path, nrows=0).columns
+    usecols = [c for c in header if c not in COLUMNS_TO_DROP]
+
+    dtypes = {c: 'category' for c in CATEGORICAL_COLUMNS if c in usecols}
+    df = pd.read_csv(csv_path, usecols=usecols, dtype=dtypes)
+
+    # Fixed ISO format: no per-row format inference (wrong values -> NaT)
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format=DATE_FORMAT, errors='coerce')
+    return df
+
+
+def cache_path_for(csv_path, source_hash, cache_dir=None) -> str:
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(csv_path)), '.cache')
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, f"{stem}.v{INGEST_VERSION}.{source_hash[:16]}.parquet")
+
+
+def load_listings(csv_path, cache_dir=None, use_cache=True) -> pd.DataFrame:
+    """
+    Drop-in replacement of pd.read_csv(csv_path) for the pipeline: clean_airbnb_data +
+    prepare_for_modeling give the same model features. Reads the Parquet cache when the
+    CSV hash matches, otherwise parses the CSV and refreshes the cache.
+    """
+    if not use_cache or not PARQUET_AVAILABLE:
+        if use_cache:
+            print("⚠️ pyarrow not installed: reading listings without the Parquet cache")
+        return read_listings_csv(csv_path)
+
+    started = time.time()
+    source_hash = file_hash(csv_path)
+    cache_path = cache_path_for(csv_path, source_hash, cache_dir)
+
+    if os.path.exists(cache_path):
+        df = pd.read_parquet(cache_path)
+        print(f"✅ Listings loaded from cache {cache_path} ({time.time() - started:.2f}s)")
+        return df
+
+    df = read_listings_csv(csv_path)
+
+    # Atomic write: a crash never leaves a half-written cache behind
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, cache_path)
+
+    # Caches of older versions of the same CSV are stale now
+    stem = os.path.basename(cache_path).split('.v')[0]
+    for name in os.listdir(os.path.dirname(cache_path)):
+        if name.startswith(f"{stem}.v") and name.endswith('.parquet') and name != os.path.basename(cache_path):
+            os.remove(os.path.join(os.path.dirname(cache_path), name))
+
+    print(f"🔄 Listings parsed and cached at {cache_path} ({time.time() - started:.2f}s)")
+    return df
+
+
+def _feature_mismatches(expected: pd.DataFrame, actual: pd.DataFrame) -> dict:
+    """{column: share of rows that differ} between two prepare_for_modeling outputs."""
+    if list(expected.columns) != list(actual.columns) or not expected.index.equals(actual.index):
+        return {"<columns/index>": 1.0}
+    mismatches = {}
+    for col in expected.columns:
+        a, b = expected[col].to_numpy(dtype=float), actual[col].to_numpy(dtype=float)
+        differ = ~((a == b) | (np.isnan(a) & np.isnan(b)))
+        if differ.any():
+            mismatches[col] = float(differ.mean())
+    return mismatches
+
+
+def verify(csv_path):
+    """
+    Model features from pd.read_csv vs this ingest (typed read and Parquet cache), on the CSV
+    and on a copy that starts with a listing without reviews (missing first dates used to differ).
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="ingest_verify_")
+    try:
+        # Copy whose first row has no review dates (moved to the top, or blanked if there is none)
+        df = pd.read_csv(csv_path)
+        missing = df[REVIEW_DATES].isna().all(axis=1)
+        if missing.any():
+            first = missing.to_numpy().argmax()
+            df = pd.concat([df.iloc[[first]], df.drop(index=df.index[first])])
+        else:
+            df.loc[df.index[0], REVIEW_DATES] = np.nan
+        missing_first_path = os.path.join(tmp_dir, "listings_missing_first.csv")
+        df.to_csv(missing_first_path, index=False)
+
+        ok = True
+        for label, path in (("as is", csv_path), ("missing first date", missing_first_path)):
+            expected = prepare_for_modeling(clean_airbnb_data(pd.read_csv(path)))
+            loaders = {"typed read": lambda: read_listings_csv(path)}
+            if PARQUET_AVAILABLE:
+                # Second call reads the Parquet cache written by the first one
+                load_listings(path, cache_dir=tmp_dir)
+                loaders["parquet cache"] = lambda: load_listings(path, cache_dir=tmp_dir)
+            for loader, load in loaders.items():
+                mismatches = _feature_mismatches(expected, prepare_for_modeling(clean_airbnb_data(load())))
+                ok &= not mismatches
+                detail = ", ".join(f"{c} {share:.1%}" for c, share in mismatches.items()) or "identical"
+                print(f"   {label:<18} {loader:<13} {len(expected)} rows x {expected.shape[1]} features: {detail}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if ok:
+        print("✅ Same model features as pd.read_csv")
+    else:
+        print("❌ Model features differ from pd.read_csv")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the columnar ingest against pd.read_csv")
+    parser.add_argument("--verify", metavar="CSV", required=True, help="Raw listings CSV (Inside Airbnb format)")
+    args = parser.parse_args()
+    if not verify(args.verify):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
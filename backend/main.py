@@ -1,17 +1,54 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import FastAPI, Header, HTTPException, Query, Response
+from pydantic import BaseModel, Field, ValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from enum import Enum
+from typing import Any, Dict, List, Literal, Optional, Union
+import numpy as np
 import pandas as pd
+import asyncio
+import hmac
 import joblib
+import json
 import os
+import signal
+import time
 from preprocessing import calculate_haversine_distance
+from translator import FeatureTemplate, check_parity
+from cache import PredictionCache
+from inference import InferenceExecutor, QueueFullError
+from batcher import MicroBatcher
+from tree_export import NativeEnsemble, export_stacking_model, verify
+from model_registry import ModelSlot, ModelVersion
+from sweep import expand_grid, expand_range, grid_size, marginal_uplift
+from heatmap import MADRID_BBOX, encode_uint16, grid_shape, make_grid
+from opportunities import CLUSTER_MAX_ZOOM, SORT_KEYS, OpportunityRepository
+from neighbourhoods import NeighbourhoodResolver
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Each worker warms its own inference path in the background, /health/ready reports when it's done
+    tasks = [asyncio.create_task(warm_up_worker())]
+    # The bargain dataset is built in a thread: /predict serves meanwhile
+    schedule_opportunity_reload()
+    if MODEL_WATCH_INTERVAL > 0:
+        tasks.append(asyncio.create_task(watch_model_artifacts()))
+    if RELOAD_REQUEST_PATH:
+        # Pre-fork worker: reloads requested on any worker arrive as a signal from the parent,
+        # and a worker forked after one of them catches up here
+        asyncio.get_running_loop().add_signal_handler(RELOAD_SIGNAL, follow_reload_request)
+        follow_reload_request()
+    yield
+    for task in tasks:
+        task.cancel()
+    inference_executor.shutdown()
 
 # 1. Initialize the FastAPI app
 app = FastAPI(
     title="Airbnb Price Predictor API",
     description="API to predict Airbnb prices in Madrid using a Stacking Ensemble model",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 2. Setup CORS
@@ -23,24 +60,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 3. Load the Machine Learning Model
+# 3. Machine Learning Model artifacts (loaded into the model slot below)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, "models", "airbnb_pricing_model.joblib")
-COLUMNS_PATH = os.path.join(BASE_DIR, "models", "model_columns.joblib")
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+MODEL_PATH = os.path.join(MODELS_DIR, "airbnb_pricing_model.joblib")
+COLUMNS_PATH = os.path.join(MODELS_DIR, "model_columns.joblib")
 
-try:
-    model = joblib.load(MODEL_PATH)
-    print("✅ Model loaded successfully!")
-except Exception as e:
-    print(f"❌ Error loading model: {e}")
-    model = None
-    
-try:
-    model_columns = joblib.load(COLUMNS_PATH)
-    print("✅ Model columns loaded successfully!")
-except Exception as e:
-    print(f"❌ Error loading model columns: {e}")
-    model_columns = None
+# Bargain dataset written by score_opportunities.py
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(BASE_DIR, "..", "data"))
+OPPORTUNITIES_PATH = os.getenv("OPPORTUNITIES_PATH", os.path.join(DATA_DIR, "chollos_madrid.csv"))
+# Polygons of the districts/neighbourhoods (Inside Airbnb neighbourhoods.geojson)
+NEIGHBOURHOODS_PATH = os.getenv("NEIGHBOURHOODS_PATH", os.path.join(DATA_DIR, "neighbourhoods.geojson"))
+
+# MODEL_MMAP_MODE=r memory-maps the large NumPy arrays of the artifact (needs an uncompressed joblib dump)
+MODEL_MMAP_MODE = os.getenv("MODEL_MMAP_MODE") or None
+
+# Seconds between checks of the artifacts on disk (0 = only reload through /admin/model/reload)
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "0"))
+
+# Set by serve.py before forking: /admin/model/reload writes the requested version here and the
+# parent forwards RELOAD_SIGNAL to every worker, so all of them swap (None = single process)
+RELOAD_REQUEST_PATH = None
+RELOAD_SIGNAL = signal.SIGUSR1
+
+# Token required by the admin endpoints (X-Admin-Token header), empty = admin endpoints disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def artifact_version(*paths) -> str:
+    # Fingerprint of the loaded artifacts (size + modification time of each file)
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{st.st_size:x}-{st.st_mtime_ns:x}")
+        except OSError:
+            parts.append("missing")
+    return ":".join(parts)
+
+# Prediction cache (PREDICTION_CACHE_SIZE=0 disables it)
+prediction_cache = PredictionCache(
+    max_size=int(os.getenv("PREDICTION_CACHE_SIZE", "4096")),
+    ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL", "3600")),
+    coord_precision=int(os.getenv("PREDICTION_CACHE_COORD_PRECISION", "4"))
+)
 
 # 4. Enums
 class RoomTypeEnum(str, Enum):
@@ -112,10 +175,48 @@ class PropertyData(BaseModel):
             }
         }
         
-# TRANSLATOR
-def transform_user_input(data: PropertyData) -> pd.DataFrame:
+class BatchPropertyData(BaseModel):
+    # Items are validated one by one in the endpoint, so a single bad property
+    # is reported back instead of rejecting the whole portfolio
+    properties: List[Dict[str, Any]] = Field(..., description="List of PropertyData payloads")
+
+# Max properties per /predict/batch call (keeps the feature matrix bounded in memory)
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+
+class SweepRange(BaseModel):
+    start: float
+    stop: float
+    step: float = Field(..., gt=0)
+
+class SweepRequest(BaseModel):
+    base: PropertyData = Field(..., description="Property to start from")
+    axes: Dict[str, Union[List[Any], SweepRange]] = Field(
+        ..., description="Feature -> values to try, e.g. {'bedrooms': [0, 1, 2], 'has_ac': [0, 1], 'review_scores_rating': {'start': 4.0, 'stop': 5.0, 'step': 0.25}}"
+    )
+
+# Max grid points per /predict/sweep call
+MAX_SWEEP_GRID = int(os.getenv("MAX_SWEEP_GRID", "5000"))
+
+class BoundingBox(BaseModel):
+    min_lat: float = Field(default=MADRID_BBOX['min_lat'], ge=-90, le=90)
+    min_lon: float = Field(default=MADRID_BBOX['min_lon'], ge=-180, le=180)
+    max_lat: float = Field(default=MADRID_BBOX['max_lat'], ge=-90, le=90)
+    max_lon: float = Field(default=MADRID_BBOX['max_lon'], ge=-180, le=180)
+
+class HeatmapRequest(BaseModel):
+    profile: PropertyData = Field(..., description="Property profile (its latitude/longitude are ignored)")
+    bbox: BoundingBox = Field(default_factory=BoundingBox)
+    resolution_m: float = Field(default=250.0, ge=10, description="Cell size in meters")
+    format: Literal["uint16", "json"] = Field(default="uint16", description="uint16: quantized base64 array, json: nested lists")
+
+# Max cells per /predict/heatmap call and rows scored per model call
+MAX_HEATMAP_CELLS = int(os.getenv("MAX_HEATMAP_CELLS", "100000"))
+HEATMAP_CHUNK_ROWS = int(os.getenv("HEATMAP_CHUNK_ROWS", "10000"))
+
+# TRANSLATOR (dict-based reference, used to validate the compiled template)
+def build_feature_row(data: PropertyData, columns: List[str]) -> dict:
     # 1. Start with a base of zeros
-    base_data = {col: 0 for col in model_columns}
+    base_data = {col: 0 for col in columns}
     
     # 2. Map direct user inputs
     base_data['latitude'] = data.latitude
@@ -204,34 +305,678 @@ def transform_user_input(data: PropertyData) -> pd.DataFrame:
     if room_col in base_data:
         base_data[room_col] = 1
         
-    # Return exactly matching the required model columns
-    df = pd.DataFrame([base_data])
-    return df[model_columns]
+    return base_data
+
+
+def parity_samples() -> List[PropertyData]:
+    # Every Neighbourhood x Room Type combination, with and without reviews
+    return [
+        PropertyData(
+            neighbourhood=n, room_type=r, latitude=40.4168, longitude=-3.7038,
+            accommodates=4, bedrooms=2, beds=2, bathrooms=1.0, has_ac=1,
+            number_of_reviews=reviews, review_scores_rating=4.6
+        )
+        for n in NeighbourhoodEnum for r in RoomTypeEnum for reviews in (0, 10)
+    ]
+
+
+# Native (pure NumPy) tree evaluator for small batches (NATIVE_EVALUATOR=1 enables it)
+NATIVE_EVALUATOR = os.getenv("NATIVE_EVALUATOR", "0") == "1"
+NATIVE_MODEL_PATH = os.getenv("NATIVE_MODEL_PATH", os.path.join(MODELS_DIR, "airbnb_pricing_model.npz"))
+NATIVE_MAX_ROWS = int(os.getenv("NATIVE_MAX_ROWS", "64"))
+
+# Synthetic single-row requests sent to a new model version before it goes live
+WARM_UP_REQUESTS = int(os.getenv("WARM_UP_REQUESTS", "20"))
+
+
+def compile_translator(columns: List[str]) -> Optional[FeatureTemplate]:
+    # COMPILED TRANSLATOR, validated against the dict-based reference
+    template = FeatureTemplate(columns)
+    mismatches = check_parity(template, lambda data: build_feature_row(data, columns), parity_samples())
+    if mismatches:
+        print(f"❌ Compiled translator differs from reference in {len(mismatches)} cases, using reference translator")
+        return None
+    print("✅ Compiled translator ready (parity check passed)")
+    return template
+
+
+def check_column_compatibility(model, columns: List[str]):
+    # The model must have been trained on exactly these columns...
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None and list(names) != list(columns):
+        raise ValueError("model_columns does not match the features the model was trained on")
+    n_features = getattr(model, "n_features_in_", None)
+    if n_features is not None and n_features != len(columns):
+        raise ValueError(f"Model expects {n_features} features, model_columns has {len(columns)}")
+
+    # ...and the translator must be able to encode every category the API accepts
+    # (one category per group may be missing: the baseline dropped by drop_first)
+    for prefix, enum in (("neighbourhood_group_cleansed_", NeighbourhoodEnum), ("room_type_", RoomTypeEnum)):
+        missing = [e.value for e in enum if f"{prefix}{e.value}" not in columns]
+        if len(missing) > 1:
+            raise ValueError(f"Columns {prefix}* missing for {missing}")
+
+
+def build_native_model(model, template: FeatureTemplate) -> Optional[NativeEnsemble]:
+    samples = template.transform(parity_samples())
+    try:
+        # Reuse the exported arrays if they belong to this model, otherwise export again
+        if os.path.exists(NATIVE_MODEL_PATH):
+            try:
+                native = NativeEnsemble.load(NATIVE_MODEL_PATH)
+                if native.feature_names and native.feature_names != template.columns:
+                    raise ValueError("Exported feature order does not match model_columns")
+                max_error = verify(native, model, samples)
+                print(f"✅ Native evaluator ready (max abs error {max_error:.2e} €)")
+                return native
+            except Exception as e:
+                print(f"⚠️ {NATIVE_MODEL_PATH} not usable ({e}), exporting from the loaded model")
+        native = export_stacking_model(model)
+        max_error = verify(native, model, samples)
+        print(f"✅ Native evaluator ready (max abs error {max_error:.2e} €)")
+        return native
+    except Exception as e:
+        print(f"❌ Native evaluator disabled: {e}")
+        return None
 
 
+def load_model_version(model_path: str, columns_path: str, version_id: str) -> ModelVersion:
+    model = joblib.load(model_path, mmap_mode=MODEL_MMAP_MODE)
+    print("✅ Model loaded successfully!")
+    columns = list(joblib.load(columns_path))
+    print("✅ Model columns loaded successfully!")
+
+    check_column_compatibility(model, columns)
+    template = compile_translator(columns)
+    native = build_native_model(model, template) if NATIVE_EVALUATOR and template is not None else None
+    return ModelVersion(version_id, model, columns, template, native, model_path, columns_path)
+
+
+def transform_user_input(data: PropertyData, version: Optional[ModelVersion] = None) -> pd.DataFrame:
+    return transform_user_inputs([data], version)
+
+
+def transform_user_inputs(items: List[PropertyData], version: Optional[ModelVersion] = None) -> pd.DataFrame:
+    # Build the whole feature matrix in one pass, exactly matching the required model columns
+    version = version or model_slot.active
+    if version.template is not None:
+        return version.template.transform(items)
+    rows = [build_feature_row(item, version.columns) for item in items]
+    return pd.DataFrame(rows, columns=version.columns)
+
+
+def predict_with(version: ModelVersion, items: List[PropertyData]) -> List[float]:
+    if version.native is not None and len(items) <= NATIVE_MAX_ROWS:
+        return [float(p) for p in version.native.predict(version.template.transform_matrix(items))]
+    return [float(p) for p in version.model.predict(transform_user_inputs(items, version))]
+
+
+def predict_locations(profile: PropertyData, lat: np.ndarray, lon: np.ndarray) -> tuple:
+    # Runs inside the inference pool: one profile at many locations (geo features built in one NumPy pass)
+    version = model_slot.active
+    X = version.template.transform_locations(profile, lat, lon)
+    if version.native is not None and len(X) <= NATIVE_MAX_ROWS:
+        prices = version.native.predict(X)
+    else:
+        prices = version.model.predict(pd.DataFrame(X, columns=version.columns))
+    return np.asarray(prices, dtype=float), version.version_id
+
+
+def predict_rows(items: List[PropertyData]) -> List[tuple]:
+    # Runs inside the inference pool: TRANSLATOR + ensemble in one go.
+    # The active version is read once, so the whole call runs on a single model version
+    version = model_slot.active
+    return [(price, version.version_id) for price in predict_with(version, items)]
+
+
+def warm_model_version(version: ModelVersion):
+    # Synthetic traffic: one full batch plus single-row calls (the hot path of /predict)
+    samples = parity_samples()
+    predictions = predict_with(version, samples)
+    if not all(p == p for p in predictions):
+        raise ValueError("Model returned NaN predictions during warm-up")
+    for sample in samples[:WARM_UP_REQUESTS]:
+        predict_with(version, [sample])
+
+
+# Inference runs outside the event loop on a bounded pool (INFERENCE_EXECUTOR=thread|process)
+inference_executor = InferenceExecutor(
+    kind=os.getenv("INFERENCE_EXECUTOR", "thread"),
+    max_workers=int(os.getenv("INFERENCE_WORKERS", "2")),
+    max_queue=int(os.getenv("INFERENCE_MAX_QUEUE", "64"))
+)
+
+
+def on_model_swap(version: ModelVersion, previous: Optional[ModelVersion]):
+    if previous is not None:
+        print(f"🔄 Model {version.version_id} is now active (was {previous.version_id})")
+    # Forked inference processes hold a copy of the old slot: replace them
+    inference_executor.reset()
+
+
+# VERSIONED MODEL SLOT (hot-swappable)
+model_slot = ModelSlot(load_model_version, warmer=warm_model_version, on_swap=on_model_swap)
+try:
+    # No warm-up here: under serve.py this runs in the parent, before forking the workers
+    model_slot.load(MODEL_PATH, COLUMNS_PATH, artifact_version(MODEL_PATH, COLUMNS_PATH), warm=False)
+except Exception as e:
+    print(f"❌ Error loading model: {e}")
+
+
+# Finished price surfaces, per (profile, bbox, resolution, format)
+heatmap_cache = PredictionCache(
+    max_size=int(os.getenv("HEATMAP_CACHE_SIZE", "32")),
+    ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+)
+
+
+# Micro-batching of concurrent /predict calls (MICRO_BATCH_MAX_WAIT_MS=0 disables it)
+micro_batcher = None
+if float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "3")) > 0:
+    micro_batcher = MicroBatcher(
+        run_batch=lambda items: inference_executor.run(predict_rows, items),
+        max_wait_ms=float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "3")),
+        max_batch=int(os.getenv("MICRO_BATCH_MAX_SIZE", "32"))
+    )
+
 
 # 6. Create the Prediction Endpoint
 @app.post("/predict")
 async def predict_price(property: PropertyData):
-    if model is None or model_columns is None:
-        raise HTTPException(status_code=500, detail="Model or columns not loaded on server.")
+    if model_slot.active is None:
+        raise HTTPException(status_code=503, detail="Model or columns not loaded on server.")
     
     try:
-        # Pass by the TRANSLATOR first
-        df_modelo = transform_user_input(property)
-        
-        # Make the prediction
-        prediction = model.predict(df_modelo)[0]
+        # Look in the cache first (near-identical payloads from the host simulator)
+        cache_key = prediction_cache.make_key(property)
+        version_id = model_slot.active.version_id
+        prediction = prediction_cache.get(cache_key, version_id)
+        timings = {"queue_ms": 0.0, "compute_ms": 0.0}
+        cached = prediction is not None
+
+        if not cached:
+            # TRANSLATOR + prediction off the event loop (stacked with concurrent requests if enabled)
+            if micro_batcher is not None:
+                (prediction, version_id), timings = await micro_batcher.submit(property)
+            else:
+                predictions, timings = await inference_executor.run(predict_rows, [property])
+                prediction, version_id = predictions[0]
+            prediction_cache.put(cache_key, prediction, version_id)
         
         # Return the result as JSON (Cambiado a Euros porque tu modelo predice en Euros)
         return {
             "predicted_price_euros": round(float(prediction), 2),
-            "currency": "EUR"
+            "currency": "EUR",
+            "model_version": version_id,
+            "cached": cached,
+            "timings_ms": timings
         }
-        
+
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error making prediction: {str(e)}")
 
+@app.post("/predict/batch")
+async def predict_price_batch(batch: BatchPropertyData):
+    if model_slot.active is None:
+        raise HTTPException(status_code=503, detail="Model or columns not loaded on server.")
+
+    if len(batch.properties) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(batch.properties)} properties (max {MAX_BATCH_SIZE})."
+        )
+
+    # 1. Validate every item on its own and keep track of the failures
+    results = [None] * len(batch.properties)
+    valid_idx, valid_items = [], []
+    for i, raw in enumerate(batch.properties):
+        try:
+            valid_items.append(PropertyData.model_validate(raw))
+            valid_idx.append(i)
+        except ValidationError as e:
+            results[i] = {"index": i, "error": e.errors(include_url=False, include_context=False)}
+
+    # 2. One feature matrix + one ensemble call for all the valid rows
+    timings = {"queue_ms": 0.0, "compute_ms": 0.0}
+    version_id = model_slot.active.version_id
+    if valid_items:
+        try:
+            predictions, timings = await inference_executor.run(predict_rows, valid_items)
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error making prediction: {str(e)}")
+
+        for i, (prediction, version_id) in zip(valid_idx, predictions):
+            results[i] = {"index": i, "predicted_price_euros": round(float(prediction), 2)}
+
+    return {
+        "predictions": results,
+        "n_predicted": len(valid_items),
+        "n_errors": len(results) - len(valid_items),
+        "currency": "EUR",
+        "model_version": version_id,
+        "timings_ms": timings
+    }
+
+@app.post("/predict/sweep")
+async def predict_sweep(request: SweepRequest):
+    if model_slot.active is None:
+        raise HTTPException(status_code=503, detail="Model or columns not loaded on server.")
+
+    base = request.base
+    base_dict = base.model_dump()
+    if not request.axes:
+        # No axis = a 0-d price tensor (and no uplift): that's /predict
+        raise HTTPException(status_code=422, detail="At least one axis is required.")
+
+    # 1. Expand and validate every axis once (each value through the PropertyData schema)
+    axes = {}
+    for name, spec in request.axes.items():
+        if name not in PropertyData.model_fields:
+            raise HTTPException(status_code=422, detail=f"Unknown feature: {name}")
+        try:
+            raw_values = expand_range(spec.start, spec.stop, spec.step, MAX_SWEEP_GRID) if isinstance(spec, SweepRange) else spec
+            if not raw_values:
+                raise ValueError("Axis without values")
+            axes[name] = [getattr(PropertyData.model_validate({**base_dict, name: v}), name) for v in raw_values]
+        except (ValidationError, ValueError) as e:
+            raise HTTPException(status_code=422, detail=f"Invalid values for '{name}': {e}")
+
+    n_points = grid_size(axes)
+    if n_points > MAX_SWEEP_GRID:
+        raise HTTPException(status_code=413, detail=f"Grid too large: {n_points} points (max {MAX_SWEEP_GRID}).")
+
+    # 2. Score the whole grid (+ the base property) in one vectorized call
+    items = expand_grid(base, axes) + [base]
+    try:
+        predictions, timings = await inference_executor.run(predict_rows, items)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error making prediction: {str(e)}")
+
+    # 3. Price tensor + marginal uplift of each feature (relative to the base value when it is on the axis)
+    base_price, version_id = predictions[-1]
+    prices = np.array([p for p, _ in predictions[:-1]]).reshape([len(v) for v in axes.values()])
+    reference_idx = [values.index(getattr(base, name)) if getattr(base, name) in values else 0 for name, values in axes.items()]
+    uplift = marginal_uplift(prices, reference_idx)
+
+    def as_json(value):
+        return value.value if isinstance(value, Enum) else value
+
+    return {
+        "base_price_euros": round(base_price, 2),
+        "axes": {name: [as_json(v) for v in values] for name, values in axes.items()},
+        "shape": list(prices.shape),
+        "prices": np.round(prices, 2).tolist(),
+        "marginal_uplift": {
+            name: {"reference": as_json(values[ref]), "uplift_euros": np.round(u, 2).tolist()}
+            for (name, values), ref, u in zip(axes.items(), reference_idx, uplift)
+        },
+        "n_points": n_points,
+        "currency": "EUR",
+        "model_version": version_id,
+        "timings_ms": timings
+    }
+
+@app.post("/predict/heatmap")
+async def predict_heatmap(request: HeatmapRequest):
+    active = model_slot.active
+    if active is None or active.template is None:
+        raise HTTPException(status_code=503, detail="Model or compiled translator not loaded on server.")
+
+    box = request.bbox
+    if box.min_lat >= box.max_lat or box.min_lon >= box.max_lon:
+        raise HTTPException(status_code=422, detail="Bounding box must have min < max.")
+    n_lat, n_lon = grid_shape(box.min_lat, box.min_lon, box.max_lat, box.max_lon, request.resolution_m)
+    if n_lat * n_lon > MAX_HEATMAP_CELLS:
+        raise HTTPException(status_code=413, detail=f"Grid too large: {n_lat}x{n_lon} cells (max {MAX_HEATMAP_CELLS}).")
+
+    # 1. Cached surface? (the profile location doesn't matter)
+    profile = request.profile.model_copy(update={"latitude": 0.0, "longitude": 0.0})
+    cache_key = (heatmap_cache.make_key(profile), tuple(box.model_dump().values()), request.resolution_m, request.format)
+    cached = heatmap_cache.get(cache_key, active.version_id)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    # 2. Cell centers (row = latitude, column = longitude) and scoring in chunks,
+    # one executor job per chunk so other requests interleave
+    lat_centers, lon_centers = make_grid(box.min_lat, box.min_lon, box.max_lat, box.max_lon, request.resolution_m)
+    lat_grid, lon_grid = np.meshgrid(lat_centers, lon_centers, indexing="ij")
+    lat_flat, lon_flat = lat_grid.ravel(), lon_grid.ravel()
+
+    prices = np.empty(lat_flat.size)
+    versions = set()
+    timings = {"queue_ms": 0.0, "compute_ms": 0.0}
+    try:
+        for start in range(0, lat_flat.size, HEATMAP_CHUNK_ROWS):
+            end = start + HEATMAP_CHUNK_ROWS
+            (chunk, version_id), chunk_timings = await inference_executor.run(
+                predict_locations, request.profile, lat_flat[start:end], lon_flat[start:end]
+            )
+            prices[start:end] = chunk
+            versions.add(version_id)
+            for k in timings:
+                timings[k] = round(timings[k] + chunk_timings[k], 3)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error making prediction: {str(e)}")
+
+    prices = prices.reshape(n_lat, n_lon)
+    surface = encode_uint16(prices) if request.format == "uint16" else {"encoding": "json", "data": np.round(prices, 2).tolist()}
+    result = {
+        "shape": [n_lat, n_lon],
+        "bbox": box.model_dump(),
+        "resolution_m": request.resolution_m,
+        "lat_centers": np.round(lat_centers, 6).tolist(),
+        "lon_centers": np.round(lon_centers, 6).tolist(),
+        "min_price_euros": round(float(prices.min()), 2),
+        "max_price_euros": round(float(prices.max()), 2),
+        "prices": surface,
+        "currency": "EUR",
+        "model_version": version_id,
+        "timings_ms": timings
+    }
+    # A surface mixing two model versions (swap mid-way) is served but not cached
+    if len(versions) == 1:
+        heatmap_cache.put(cache_key, result, version_id)
+    return {**result, "cached": False}
+
+# Indexed bargain dataset, built at startup and rebuilt in a thread when the CSV changes
+opportunity_repository = OpportunityRepository(OPPORTUNITIES_PATH, artifact_version)
+MAX_OPPORTUNITIES_PAGE = int(os.getenv("MAX_OPPORTUNITIES_PAGE", "500"))
+
+# Serialized map layers, per (zoom, filters); dropped when the dataset changes
+map_layer_cache = PredictionCache(
+    max_size=int(os.getenv("MAP_LAYER_CACHE_SIZE", "256")),
+    ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+)
+
+opportunity_reload_tasks = set()
+
+
+async def reload_opportunities():
+    # CSV parsing + index build off the event loop, like reload_model
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, opportunity_repository.load)
+    except Exception as e:
+        print(f"❌ Opportunity dataset reload failed, keeping the previous one: {e}")
+
+
+def schedule_opportunity_reload():
+    if opportunity_reload_tasks or opportunity_repository.loading:
+        return
+    task = asyncio.create_task(reload_opportunities())
+    opportunity_reload_tasks.add(task)  # Keep a reference until it finishes
+    task.add_done_callback(opportunity_reload_tasks.discard)
+
+
+def require_opportunity_store():
+    # Never builds on the event loop: a changed CSV is reloaded in the background and
+    # the previous store keeps answering until the new one is ready
+    store, stale = opportunity_repository.get()
+    if stale:
+        schedule_opportunity_reload()
+    if store is None:
+        detail = "Opportunity dataset is loading, retry shortly." if stale or opportunity_reload_tasks \
+            else "Opportunity dataset not available on server."
+        raise HTTPException(status_code=503, detail=detail)
+    return store
+
+@app.get("/opportunities")
+async def list_opportunities(
+    min_savings: float = Query(default=0.0, ge=0, description="Minimum residual (€/night)"),
+    district: Optional[List[str]] = Query(default=None, description="Repeat to select several districts"),
+    room_type: Optional[List[str]] = Query(default=None, description="Repeat to select several room types"),
+    sort: Literal[tuple(SORT_KEYS)] = "residual",
+    order: Literal["asc", "desc"] = "desc",
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=50, ge=1, le=MAX_OPPORTUNITIES_PAGE),
+):
+    store = require_opportunity_store()
+    total, summary, items = store.query(min_savings, district, room_type, sort, order, offset, limit)
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "summary": summary,
+        "facets": store.facets(),
+        "items": items,
+        "dataset_version": store.version
+    }
+
+@app.get("/opportunities/nearby")
+async def nearby_opportunities(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(default=1000.0, gt=0, le=50000),
+    min_savings: float = Query(default=0.0, ge=0),
+    limit: int = Query(default=50, ge=1, le=MAX_OPPORTUNITIES_PAGE),
+):
+    """Bargains within radius_m of the point, closest first (each item has distance_m)."""
+    store = require_opportunity_store()
+    total, items = store.nearby(lat, lon, radius_m, min_savings, limit)
+    return {"total": total, "items": items, "dataset_version": store.version}
+
+@app.get("/opportunities/nearest")
+async def nearest_opportunities(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(default=10, ge=1, le=MAX_OPPORTUNITIES_PAGE),
+    min_savings: float = Query(default=0.0, ge=0),
+):
+    """k closest bargains to the point, closest first (each item has distance_m)."""
+    store = require_opportunity_store()
+    total, items = store.nearest(lat, lon, k, min_savings)
+    return {"total": total, "items": items, "dataset_version": store.version}
+
+@app.get("/opportunities/bbox")
+async def opportunities_in_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    min_savings: float = Query(default=0.0, ge=0),
+    limit: int = Query(default=200, ge=1, le=MAX_OPPORTUNITIES_PAGE),
+):
+    """Bargains inside the map viewport, biggest residual first."""
+    if min_lat >= max_lat or min_lon >= max_lon:
+        raise HTTPException(status_code=422, detail="Bounding box must have min < max.")
+    store = require_opportunity_store()
+    total, items = store.within(min_lat, min_lon, max_lat, max_lon, min_savings, limit)
+    return {"total": total, "items": items, "dataset_version": store.version}
+
+@app.get("/opportunities/map")
+async def opportunities_map_layer(
+    zoom: int = Query(default=12, ge=0, le=22, description="Map zoom level (clusters below %d)" % CLUSTER_MAX_ZOOM),
+    min_savings: float = Query(default=0.0, ge=0),
+    district: Optional[List[str]] = Query(default=None),
+    room_type: Optional[List[str]] = Query(default=None),
+):
+    """Every matching bargain as one GeoJSON FeatureCollection, clustered server-side by zoom level."""
+    store = require_opportunity_store()
+    # Every zoom from CLUSTER_MAX_ZOOM on gives the same layer
+    cache_key = (min(zoom, CLUSTER_MAX_ZOOM), min_savings, tuple(sorted(district or ())), tuple(sorted(room_type or ())))
+    body = map_layer_cache.get(cache_key, store.version)
+    if body is None:
+        body = store.map_layer_json(*cache_key)
+        map_layer_cache.put(cache_key, body, store.version)
+    return Response(content=body, media_type="application/geo+json", headers={"X-Dataset-Version": store.version})
+
+# Offline (lat, lon) -> district/neighbourhood lookup, loaded once
+try:
+    neighbourhood_resolver = NeighbourhoodResolver.from_geojson(NEIGHBOURHOODS_PATH)
+    print(f"✅ Neighbourhood resolver ready: {len(neighbourhood_resolver)} polygons")
+except (OSError, ValueError) as e:
+    neighbourhood_resolver = None
+    print(f"⚠️ Neighbourhood resolver not available: {e}")
+
+@app.get("/neighbourhoods/resolve")
+async def resolve_neighbourhood(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+):
+    """District and neighbourhood of a point (GeoJSON labels), without any geocoding service."""
+    if neighbourhood_resolver is None:
+        raise HTTPException(status_code=503, detail="Neighbourhood polygons not available on server.")
+    zone = neighbourhood_resolver.resolve(lat, lon)
+    if zone is None:
+        raise HTTPException(status_code=404, detail="Location outside the Madrid neighbourhoods.")
+    return {"latitude": lat, "longitude": lon, **zone}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {"predictions": prediction_cache.stats(), "heatmaps": heatmap_cache.stats(), "map_layers": map_layer_cache.stats()}
+
+@app.get("/inference/stats")
+async def inference_stats():
+    return {
+        "executor": inference_executor.stats(),
+        "micro_batching": micro_batcher.stats() if micro_batcher is not None else None
+    }
+
+# Per-worker state (each forked worker has its own copy)
+worker_state = {"pid": None, "ready": False, "started_at": time.time(), "warm_up_ms": None, "error": None}
+
+
+async def warm_up_worker():
+    worker_state["pid"] = os.getpid()
+    if model_slot.active is None:
+        worker_state["error"] = "Model or columns not loaded on server."
+        return
+    try:
+        _, timings = await inference_executor.run(predict_rows, parity_samples()[:1])
+        worker_state["warm_up_ms"] = timings["compute_ms"]
+        worker_state["ready"] = True
+    except Exception as e:
+        worker_state["error"] = str(e)
+        print(f"❌ Worker {os.getpid()} warm-up failed: {e}")
+
+
+@app.get("/health/live")
+async def liveness():
+    # The event loop answers -> the worker is alive
+    return {"status": "alive", "pid": os.getpid(), "uptime_s": round(time.time() - worker_state["started_at"], 1)}
+
+@app.get("/health/ready")
+async def readiness():
+    # Ready only once this worker has actually produced a prediction
+    status = {
+        "ready": worker_state["ready"],
+        "pid": os.getpid(),
+        "model_version": model_slot.active.version_id if model_slot.active is not None else None,
+        "warm_up_ms": worker_state["warm_up_ms"],
+        "error": worker_state["error"]
+    }
+    if not worker_state["ready"]:
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+async def reload_model(model_path: str, columns_path: str):
+    # Load + warm in a thread: the event loop and the active version keep serving meanwhile
+    fingerprint = artifact_version(model_path, columns_path)
+    try:
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: model_slot.load(model_path, columns_path, fingerprint)
+        )
+    except Exception as e:
+        print(f"❌ Model reload failed, keeping {model_slot.active.version_id if model_slot.active else None}: {e}")
+
+
+async def watch_model_artifacts():
+    # Reload when the files on disk change (e.g. a new artifact copied over with an atomic rename).
+    # Watches the files the active version came from, so a reload of another version through
+    # /admin/model/reload is not undone by the default artifacts
+    while True:
+        await asyncio.sleep(MODEL_WATCH_INTERVAL)
+        active = model_slot.active
+        model_path = active.model_path if active is not None and active.model_path else MODEL_PATH
+        columns_path = active.columns_path if active is not None and active.columns_path else COLUMNS_PATH
+        fingerprint = artifact_version(model_path, columns_path)
+        if not model_slot.loading and (active is None or active.fingerprint != fingerprint):
+            await reload_model(model_path, columns_path)
+
+
+class ModelReloadRequest(BaseModel):
+    # File names inside backend/models (defaults: the standard artifact names)
+    model_file: Optional[str] = Field(default=None, description="e.g. airbnb_pricing_model_v2.joblib")
+    columns_file: Optional[str] = Field(default=None, description="e.g. model_columns_v2.joblib")
+
+
+reload_tasks = set()
+
+
+def start_reload(model_path: str, columns_path: str):
+    task = asyncio.create_task(reload_model(model_path, columns_path))
+    reload_tasks.add(task)  # Keep a reference until it finishes
+    task.add_done_callback(reload_tasks.discard)
+
+
+def broadcast_reload(model_path: str, columns_path: str):
+    # Atomic write, then the parent signals every worker (this one included)
+    tmp_path = f"{RELOAD_REQUEST_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"model_path": model_path, "columns_path": columns_path}, f)
+    os.replace(tmp_path, RELOAD_REQUEST_PATH)
+    os.kill(os.getppid(), RELOAD_SIGNAL)
+
+
+def follow_reload_request():
+    # Loads the version in RELOAD_REQUEST_PATH unless it is already the active one
+    try:
+        with open(RELOAD_REQUEST_PATH) as f:
+            request = json.load(f)
+        model_path, columns_path = request["model_path"], request["columns_path"]
+    except (OSError, ValueError, KeyError):
+        return
+    if model_slot.loading:
+        # Check again once the current load is over
+        asyncio.get_running_loop().call_later(1.0, follow_reload_request)
+        return
+    active = model_slot.active
+    if active is not None and (active.model_path, active.columns_path) == (model_path, columns_path) \
+            and active.fingerprint == artifact_version(model_path, columns_path):
+        return
+    start_reload(model_path, columns_path)
+
+
+def check_admin_token(token: Optional[str]):
+    # Fail closed: without a configured token nobody (e.g. any web page, CORS is open) can use them
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set).")
+    if not hmac.compare_digest((token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+
+@app.get("/admin/model")
+async def model_status(x_admin_token: Optional[str] = Header(default=None)):
+    check_admin_token(x_admin_token)
+    return {"pid": os.getpid(), **model_slot.status()}
+
+@app.post("/admin/model/reload", status_code=202)
+async def model_reload(request: ModelReloadRequest = ModelReloadRequest(), x_admin_token: Optional[str] = Header(default=None)):
+    check_admin_token(x_admin_token)
+    if model_slot.loading:
+        raise HTTPException(status_code=409, detail="A model version is already being loaded.")
+
+    # Only file names are accepted, always resolved inside the models folder
+    model_path = os.path.join(MODELS_DIR, os.path.basename(request.model_file)) if request.model_file else MODEL_PATH
+    columns_path = os.path.join(MODELS_DIR, os.path.basename(request.columns_file)) if request.columns_file else COLUMNS_PATH
+    for path in (model_path, columns_path):
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail=f"{os.path.basename(path)} not found in models folder.")
+
+    if RELOAD_REQUEST_PATH:
+        broadcast_reload(model_path, columns_path)
+    else:
+        start_reload(model_path, columns_path)
+    return {"status": "loading", "pid": os.getpid(), "all_workers": bool(RELOAD_REQUEST_PATH),
+            "active_version": model_slot.active.version_id if model_slot.active else None}
+
 @app.get("/")
 async def root():
     return {"message": "Airbnb Price Predictor API is running! 🚀"}
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+Peak memory of clean_airbnb_data + prepare_for_modeling, default (copies) vs in-place mode.
+
+Every mode runs in a fresh Python process so their peaks don't mix. The raw CSV is loaded
+first and the peak counter is reset after it, so "pipeline peak" only measures the pipeline.
+
+Usage:
+    python memory_benchmark.py ../data/listings.csv --scale 10
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+MODES = ("copy", "inplace")
+
+
+def read_status_mb(field):
+    # Linux only: VmRSS (current) / VmHWM (peak) from /proc, None elsewhere
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak():
+    """Resets VmHWM to the current RSS (Linux >= 4.0). Returns False if not possible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_mb():
+    peak = read_status_mb("VmHWM")
+    if peak is None:
+        # ru_maxrss is in KB on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform != "darwin" else 1024 ** 2)
+    return peak
+
+
+def run_mode(mode, csv_path):
+    from preprocessing import clean_airbnb_data, prepare_for_modeling
+
+    df_raw = pd.read_csv(csv_path)
+    gc.collect()
+    baseline = read_status_mb("VmRSS")
+    peak_reset = reset_peak()
+
+    started = time.perf_counter()
+    if mode == "inplace":
+        df_model = prepare_for_modeling(clean_airbnb_data(df_raw, inplace=True), inplace=True)
+    else:
+        df_model = prepare_for_modeling(clean_airbnb_data(df_raw))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "mode": mode,
+        "rows": len(df_model),
+        "seconds": round(elapsed, 3),
+        "rss_after_load_mb": round(baseline, 1) if baseline is not None else None,
+        "peak_mb": round(peak_mb(), 1),
+        # Without the reset the peak may come from read_csv itself
+        "peak_reset": peak_reset,
+    }
+
+
+def make_synthetic(csv_path, scale):
+    """Synthetic listings file: the real one repeated `scale` times (temp file, caller deletes it)."""
+    df = pd.read_csv(csv_path)
+    fd, path = tempfile.mkstemp(suffix=".csv", prefix="listings_x%d_" % scale)
+    os.close(fd)
+    pd.concat([df] * scale, ignore_index=True).to_csv(path, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS of the preprocessing pipeline, copies vs in place")
+    parser.add_argument("csv", help="Raw listings CSV (Inside Airbnb format)")
+    parser.add_argument("--scale", type=int, default=1, help="Repeat the listings N times (synthetic file)")
+    parser.add_argument("--run-mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child process: measure one mode and report it as JSON
+    if args.run_mode:
+        print(json.dumps(run_mode(args.run_mode, args.csv)))
+        return
+
+    csv_path = make_synthetic(args.csv, args.scale) if args.scale > 1 else args.csv
+    try:
+        size_mb = os.path.getsize(csv_path) / 1024 ** 2
+        print(f"📊 {csv_path} ({size_mb:.1f} MB on disk)")
+        results = {}
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), csv_path, "--run-mode", mode],
+                check=True, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+    finally:
+        if csv_path != args.csv:
+            os.remove(csv_path)
+
+    for mode, r in results.items():
+        overhead = r["peak_mb"] - r["rss_after_load_mb"] if r["rss_after_load_mb"] is not None else float("nan")
+        print(f"{mode:>8}: {r['rows']} rows in {r['seconds']:.2f}s | "
+              f"RSS after load {r['rss_after_load_mb']} MB | peak {r['peak_mb']} MB | pipeline peak +{overhead:.1f} MB")
+    if not all(r["peak_reset"] for r in results.values()):
+        print("⚠️ Peak counter could not be reset: peaks include read_csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import hashlib
+import itertools
+import threading
+import time
+
+
+class ModelVersion:
+    """Everything a prediction needs, bundled so it can be swapped as a single reference."""
+
+    def __init__(self, version_id, model, columns, template, native=None, model_path=None, columns_path=None):
+        self.version_id = version_id
+        self.model = model
+        self.columns = columns
+        self.template = template
+        self.native = native
+        self.model_path = model_path
+        self.columns_path = columns_path
+        self.fingerprint = ""
+
+        self.loaded_at = time.time()
+        self.load_ms = None
+        self.warm_ms = None
+
+    def info(self):
+        return {
+            "version": self.version_id,
+            "model_path": self.model_path,
+            "columns_path": self.columns_path,
+            "n_columns": len(self.columns),
+            "compiled_translator": self.template is not None,
+            "native_evaluator": self.native is not None,
+            "loaded_at": self.loaded_at,
+            "load_ms": self.load_ms,
+            "warm_ms": self.warm_ms,
+        }
+
+
+class ModelSlot:
+    """
+    Holds the active ModelVersion and replaces it atomically.
+
+    `loader(model_path, columns_path, version_id)` builds a ModelVersion (load + checks) and
+    `warmer(version)` runs synthetic traffic through it. Both run before the swap, so the
+    active version keeps serving meanwhile. Requests grab `slot.active` once and keep that
+    reference, so in-flight work always finishes on the version it started with.
+    """
+
+    def __init__(self, loader, warmer=None, on_swap=None, history_size=5):
+        self.loader = loader
+        self.warmer = warmer
+        self.on_swap = on_swap
+        self.history_size = history_size
+
+        self.active = None
+        self.history = []
+        self.loading = False
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+
+    def load(self, model_path, columns_path, fingerprint="", warm=True):
+        """Loads, validates and (optionally) warms a new version, then swaps it in. Blocking."""
+        with self._lock:
+            if self.loading:
+                raise RuntimeError("Another model version is already being loaded")
+            self.loading = True
+        try:
+            version_id = f"v{next(self._counter)}"
+            if fingerprint:
+                version_id += "-" + hashlib.sha1(fingerprint.encode()).hexdigest()[:8]
+            started = time.time()
+            version = self.loader(model_path, columns_path, version_id)
+            version.fingerprint = fingerprint
+            version.load_ms = round((time.time() - started) * 1000, 1)
+
+            if warm and self.warmer is not None:
+                started = time.time()
+                self.warmer(version)
+                version.warm_ms = round((time.time() - started) * 1000, 1)
+
+            self.swap(version)
+            self.last_error = None
+            return version
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.loading = False
+
+    def swap(self, version):
+        previous, self.active = self.active, version
+        if previous is not None:
+            self.history = ([previous.info()] + self.history)[:self.history_size]
+        if self.on_swap is not None:
+            self.on_swap(version, previous)
+
+    def status(self):
+        return {
+            "active": self.active.info() if self.active is not None else None,
+            "loading": self.loading,
+            "last_error": self.last_error,
+            "previous": self.history,
+        }
@@ -0,0 +1,143 @@
+"""
+Offline (lat, lon) -> (district, neighbourhood) resolver over data/neighbourhoods.geojson.
+
+The polygons are loaded once. A uniform grid over their extent keeps, for every cell, the
+polygons whose bounding box touches it, so a lookup runs the point-in-polygon test on one
+or two candidates only. Labels are the GeoJSON ones (neighbourhood_group / neighbourhood).
+
+Check it against the labels of the listings (and time it):
+    python neighbourhoods.py --verify ../data/listings.csv
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+
+class NeighbourhoodResolver:
+    def __init__(self, features, grid_size=64):
+        # 1. Polygons: every ring edge of a feature in one array (even-odd rule handles holes and MultiPolygons)
+        self.labels = []
+        self.edges = []
+        boxes = []
+        for feature in features:
+            geometry = feature.get('geometry') or {}
+            if geometry.get('type') == 'Polygon':
+                polygons = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiPolygon':
+                polygons = geometry['coordinates']
+            else:
+                continue
+            rings = [np.asarray(ring, dtype=float)[:, :2] for polygon in polygons for ring in polygon if len(ring) >= 3]
+            if not rings:
+                continue
+
+            start = np.concatenate(rings)
+            end = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings])
+            # Horizontal edges never cross the ray
+            keep = start[:, 1] != end[:, 1]
+            start, end = start[keep], end[keep]
+            slope = (end[:, 0] - start[:, 0]) / (end[:, 1] - start[:, 1])
+
+            props = feature.get('properties') or {}
+            self.labels.append((props.get('neighbourhood_group'), props.get('neighbourhood')))
+            self.edges.append((start[:, 0], start[:, 1], end[:, 1], slope))
+            all_points = np.concatenate(rings)
+            boxes.append([*all_points.min(axis=0), *all_points.max(axis=0)])
+        self.boxes = np.array(boxes, dtype=float).reshape(-1, 4)  # min_lon, min_lat, max_lon, max_lat
+
+        # 2. Grid: polygons whose bounding box touches each cell
+        self.grid_size = grid_size
+        if len(self.boxes):
+            self.min_lon, self.min_lat = self.boxes[:, 0].min(), self.boxes[:, 1].min()
+            self.lon_step = max(self.boxes[:, 2].max() - self.min_lon, 1e-9) / grid_size
+            self.lat_step = max(self.boxes[:, 3].max() - self.min_lat, 1e-9) / grid_size
+        else:
+            self.min_lon = self.min_lat = 0.0
+            self.lon_step = self.lat_step = 1.0
+        cells = [[] for _ in range(grid_size * grid_size)]
+        for i, (min_lon, min_lat, max_lon, max_lat) in enumerate(self.boxes):
+            c0, r0 = self._cell(min_lon, min_lat)
+            c1, r1 = self._cell(max_lon, max_lat)
+            for r in range(r0, r1 + 1):
+                for c in range(c0, c1 + 1):
+                    cells[r * grid_size + c].append(i)
+        self.cells = [np.array(ids, dtype=np.int64) for ids in cells]
+
+    @classmethod
+    def from_geojson(cls, path, grid_size=64):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f).get('features', []), grid_size)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _cell(self, lon, lat):
+        col = min(max(int((lon - self.min_lon) // self.lon_step), 0), self.grid_size - 1)
+        row = min(max(int((lat - self.min_lat) // self.lat_step), 0), self.grid_size - 1)
+        return col, row
+
+    def _contains(self, i, lon, lat):
+        x0, y0, y1, slope = self.edges[i]
+        crosses = (y0 > lat) != (y1 > lat)
+        return np.count_nonzero(crosses & (lon < x0 + (lat - y0) * slope)) % 2 == 1
+
+    def locate(self, lat, lon):
+        """Index of the polygon that contains the point, or None."""
+        if not len(self.boxes):
+            return None
+        col, row = self._cell(lon, lat)
+        for i in self.cells[row * self.grid_size + col]:
+            min_lon, min_lat, max_lon, max_lat = self.boxes[i]
+            if min_lon <= lon <= max_lon and min_lat <= lat <= max_lat and self._contains(i, lon, lat):
+                return int(i)
+        return None
+
+    def resolve(self, lat, lon):
+        """{'district', 'neighbourhood'} of the point, or None outside every polygon."""
+        i = self.locate(lat, lon)
+        if i is None:
+            return None
+        district, neighbourhood = self.labels[i]
+        return {"district": district, "neighbourhood": neighbourhood}
+
+
+def verify(geojson_path, csv_path):
+    """Resolver vs the labels of the listings and vs testing every polygon (no grid)."""
+    resolver = NeighbourhoodResolver.from_geojson(geojson_path)
+    columns = ['latitude', 'longitude', 'neighbourhood_group_cleansed', 'neighbourhood_cleansed']
+    df = pd.read_csv(csv_path, usecols=lambda c: c in columns).dropna(subset=['latitude', 'longitude'])
+    points = list(zip(df['latitude'].to_numpy(dtype=float), df['longitude'].to_numpy(dtype=float)))
+
+    started = time.perf_counter()
+    found = [resolver.locate(lat, lon) for lat, lon in points]
+    index_us = (time.perf_counter() - started) / max(len(points), 1) * 1e6
+
+    started = time.perf_counter()
+    brute = [next((i for i in range(len(resolver)) if resolver._contains(i, lon, lat)), None) for lat, lon in points]
+    brute_us = (time.perf_counter() - started) / max(len(points), 1) * 1e6
+    assert found == brute, "grid index and full scan disagree"
+
+    print(f"📊 {len(resolver)} polygons, {len(points)} listings")
+    print(f"   lookup {index_us:.1f} µs (grid) | {brute_us:.1f} µs (every polygon)")
+    print(f"   outside every polygon: {sum(i is None for i in found)}")
+    for label, column in ((0, 'neighbourhood_group_cleansed'), (1, 'neighbourhood_cleansed')):
+        if column in df.columns:
+            resolved = [resolver.labels[i][label] if i is not None else None for i in found]
+            agreement = np.mean(np.array(resolved, dtype=object) == df[column].to_numpy(dtype=object)) * 100
+            print(f"   {column}: {agreement:.2f} % match the listings")
+    print("✅ Grid index and full scan return the same polygons")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the neighbourhood resolver against the listings")
+    parser.add_argument("--verify", metavar="CSV", required=True, help="Listings CSV with latitude/longitude")
+    parser.add_argument("--geojson", default="../data/neighbourhoods.geojson")
+    args = parser.parse_args()
+    verify(args.geojson, args.verify)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+import json
+import threading
+import numpy as np
+import pandas as pd
+
+from spatial import SpatialIndex, cluster_labels
+
+# Columns served by GET /opportunities (in this order)
+OPPORTUNITY_COLUMNS = [
+    'listing_url', 'latitude', 'longitude', 'neighbourhood_group_cleansed', 'neighbourhood_cleansed',
+    'room_type', 'accommodates', 'price', 'predicted_price', 'residual', 'discount_pct',
+]
+SORT_KEYS = ['residual', 'discount_pct', 'price', 'predicted_price']
+# Properties of every single-bargain feature of the map layer
+POINT_PROPERTIES = ['listing_url', 'price', 'predicted_price', 'residual', 'discount_pct']
+# From this zoom level on the map layer shows every bargain (no clusters)
+CLUSTER_MAX_ZOOM = 16
+
+
+def _posting_lists(values: np.ndarray) -> dict:
+    """{value: ascending positions}. Positions follow the residual order, so every list is residual-sorted too."""
+    codes, uniques = pd.factorize(values, sort=True)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return {
+        str(value): order[bounds[i]:bounds[i + 1]]
+        for i, value in enumerate(uniques)
+    }
+
+
+class OpportunityStore:
+    """
+    In-memory index of the bargain dataset (chollos_madrid.csv), loaded once.
+
+    Rows are kept sorted by residual (descending), so min-savings is a prefix of the arrays.
+    Districts and room types have posting lists of row positions, and every other sort key
+    has a precomputed rank, so a query only touches the rows that match. Rows with
+    coordinates are in a SpatialIndex for radius, viewport and k-nearest queries.
+    """
+
+    def __init__(self, df: pd.DataFrame, version: str = ""):
+        df = df.copy()
+        # Same rules as the old Streamlit loader: residual/discount computed if missing, bargains only
+        if 'residual' not in df.columns and {'price', 'predicted_price'} <= set(df.columns):
+            df['residual'] = df['predicted_price'] - df['price']
+        df = df[df['residual'] > 0]
+        if 'discount_pct' not in df.columns:
+            df['discount_pct'] = df['residual'] / df['predicted_price'] * 100
+        df = df.sort_values('residual', ascending=False, kind="stable").reset_index(drop=True)
+
+        self.version = version
+        self.columns = [c for c in OPPORTUNITY_COLUMNS if c in df.columns]
+        self.records = df[self.columns].astype(object).where(df[self.columns].notna(), None).to_dict("records")
+        self.residual = df['residual'].to_numpy(dtype=float)
+        self.discount = df['discount_pct'].to_numpy(dtype=float)
+
+        # Rank of every row for each sort key (0 = smallest)
+        self.ranks = {
+            key: np.argsort(np.argsort(df[key].to_numpy(dtype=float), kind="stable"), kind="stable")
+            for key in SORT_KEYS if key in df.columns
+        }
+        self.by_district = _posting_lists(df['neighbourhood_group_cleansed'].to_numpy()) \
+            if 'neighbourhood_group_cleansed' in df.columns else {}
+        self.by_room_type = _posting_lists(df['room_type'].to_numpy()) if 'room_type' in df.columns else {}
+
+        # Spatial index over the rows with coordinates (index position -> row position)
+        self.lat = df['latitude'].to_numpy(dtype=float) if 'latitude' in df.columns else np.full(len(df), np.nan)
+        self.lon = df['longitude'].to_numpy(dtype=float) if 'longitude' in df.columns else np.full(len(df), np.nan)
+        self.geo_rows = np.flatnonzero(~np.isnan(self.lat) & ~np.isnan(self.lon))
+        self.spatial = SpatialIndex(self.lat[self.geo_rows], self.lon[self.geo_rows])
+        self.point_columns = {c: df[c].to_numpy() for c in POINT_PROPERTIES if c in df.columns}
+
+    @classmethod
+    def from_csv(cls, path: str, version: str = ""):
+        return cls(pd.read_csv(path), version)
+
+    def __len__(self):
+        return len(self.records)
+
+    def facets(self) -> dict:
+        return {
+            "districts": sorted(self.by_district),
+            "room_types": sorted(self.by_room_type),
+            "max_residual": round(float(self.residual[0]), 2) if len(self) else 0.0,
+            "count": len(self),
+        }
+
+    def _union(self, posting, keys, limit):
+        # Positions of every requested key, below `limit` (the min-savings prefix)
+        parts = [p[:np.searchsorted(p, limit)] for p in (posting.get(k) for k in keys) if p is not None]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def _filter(self, min_savings=0.0, districts=None, room_types=None):
+        """Positions of the matching rows, ascending (= residual-descending order)."""
+        # 1. min-savings: rows are residual-sorted (descending), so it's a prefix
+        end = self._savings_end(min_savings)
+
+        # 2. Filters: posting lists cut to the prefix, intersected with each other
+        positions = None
+        for posting, keys in ((self.by_district, districts), (self.by_room_type, room_types)):
+            if keys:
+                matches = self._union(posting, keys, end)
+                positions = matches if positions is None else np.intersect1d(positions, matches, assume_unique=True)
+        return np.arange(end) if positions is None else positions
+
+    def query(self, min_savings=0.0, districts=None, room_types=None, sort="residual", order="desc", offset=0, limit=50):
+        """Returns (total matches, summary of the matches, requested page of records)."""
+        positions = self._filter(min_savings, districts, room_types)
+
+        # Sort (positions are already in residual-descending order)
+        if sort != "residual" or order != "desc":
+            ranks = self.ranks[sort][positions]
+            positions = positions[np.argsort(-ranks if order == "desc" else ranks, kind="stable")]
+
+        page = positions[offset:offset + limit]
+        summary = {
+            "count": int(positions.size),
+            "avg_residual": round(float(self.residual[positions].mean()), 2) if positions.size else None,
+            "max_discount_pct": round(float(self.discount[positions].max()), 2) if positions.size else None,
+        }
+        return int(positions.size), summary, [self.records[i] for i in page]
+
+    def _savings_end(self, min_savings):
+        return int(np.searchsorted(-self.residual, -min_savings, side="right"))
+
+    def _located(self, geo_positions, distances, min_savings, limit):
+        # Index positions -> rows above min-savings, as records with their distance
+        rows = self.geo_rows[geo_positions]
+        keep = rows < self._savings_end(min_savings)
+        rows, distances = rows[keep], distances[keep]
+        items = [dict(self.records[i], distance_m=round(float(d), 1)) for i, d in zip(rows[:limit], distances[:limit])]
+        return int(rows.size), items
+
+    def nearby(self, lat, lon, radius_m, min_savings=0.0, limit=50):
+        """Bargains within radius_m of (lat, lon), closest first. Returns (total, records)."""
+        return self._located(*self.spatial.radius(lat, lon, radius_m), min_savings, limit)
+
+    def nearest(self, lat, lon, k=10, min_savings=0.0):
+        """k closest bargains to (lat, lon). Returns (total, records)."""
+        keep = self.geo_rows < self._savings_end(min_savings) if min_savings > 0 else None
+        return self._located(*self.spatial.nearest(lat, lon, k, keep), min_savings, k)
+
+    def within(self, min_lat, min_lon, max_lat, max_lon, min_savings=0.0, limit=200):
+        """Bargains inside the box (map viewport), biggest residual first. Returns (total, records)."""
+        # Ascending index positions -> ascending rows -> residual-descending order
+        rows = self.geo_rows[self.spatial.bbox(min_lat, min_lon, max_lat, max_lon)]
+        rows = rows[rows < self._savings_end(min_savings)]
+        return int(rows.size), [self.records[i] for i in rows[:limit]]
+
+
+    def _point_features(self, rows):
+        columns = [(c, self.point_columns[c]) for c in POINT_PROPERTIES if c in self.point_columns]
+        return [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [round(float(self.lon[i]), 6), round(float(self.lat[i]), 6)]},
+                "properties": {"count": 1, **{c: _json_value(values[i]) for c, values in columns}},
+            }
+            for i in rows
+        ]
+
+    def map_layer(self, zoom, min_savings=0.0, districts=None, room_types=None) -> dict:
+        """
+        GeoJSON FeatureCollection of the matching bargains for a map zoom level.
+        Below CLUSTER_MAX_ZOOM nearby bargains are merged into one feature per screen cell
+        (centroid, count, mean savings, max discount); lone bargains stay single points.
+        """
+        rows = self._filter(min_savings, districts, room_types)
+        rows = rows[~np.isnan(self.lat[rows]) & ~np.isnan(self.lon[rows])]
+        if zoom >= CLUSTER_MAX_ZOOM or rows.size == 0:
+            return {"type": "FeatureCollection", "features": self._point_features(rows)}
+
+        labels, n_clusters = cluster_labels(self.lat[rows], self.lon[rows], zoom)
+        counts = np.bincount(labels, minlength=n_clusters)
+        lat = np.bincount(labels, weights=self.lat[rows], minlength=n_clusters) / counts
+        lon = np.bincount(labels, weights=self.lon[rows], minlength=n_clusters) / counts
+        avg_residual = np.bincount(labels, weights=self.residual[rows], minlength=n_clusters) / counts
+        max_discount = np.full(n_clusters, -np.inf)
+        np.maximum.at(max_discount, labels, self.discount[rows])
+        # Rows are residual-sorted, so the first row of a cluster is its best bargain
+        _, first = np.unique(labels, return_index=True)
+
+        singles = counts == 1
+        clusters = [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [round(float(lon[c]), 6), round(float(lat[c]), 6)]},
+                "properties": {
+                    "count": int(counts[c]),
+                    "residual": round(float(avg_residual[c]), 2),
+                    "discount_pct": round(float(max_discount[c]), 2),
+                    "listing_url": _json_value(self.point_columns['listing_url'][rows[first[c]]])
+                    if 'listing_url' in self.point_columns else None,
+                },
+            }
+            for c in np.flatnonzero(~singles)
+        ]
+        return {"type": "FeatureCollection", "features": clusters + self._point_features(rows[first[singles]])}
+
+    def map_layer_json(self, zoom, min_savings=0.0, districts=None, room_types=None) -> bytes:
+        """map_layer serialized once, ready to be cached and sent as is."""
+        layer = self.map_layer(zoom, min_savings, districts, room_types)
+        return json.dumps(layer, separators=(",", ":"), allow_nan=False).encode()
+
+
+def _json_value(value):
+    # NumPy scalars / NaN -> plain JSON values
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else round(float(value), 2)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+class OpportunityRepository:
+    """
+    Keeps the store of the current CSV. load() builds it (blocking: run it off the event loop);
+    get() never builds anything, it returns the last store built even if the CSV changed since.
+    """
+
+    def __init__(self, path, version_fn):
+        self.path = path
+        self.version_fn = version_fn
+        self.store = None
+        self.loading = False
+        self.last_error = None
+        self._failed_version = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        (store, stale): the last OpportunityStore built (None if there is none yet or the CSV is
+        gone) and whether the CSV changed since, i.e. load() should run.
+        """
+        version = self.version_fn(self.path)
+        if version == "missing":
+            return None, False
+        store = self.store
+        # A version that failed to load is not retried until the file changes again
+        stale = (store is None or store.version != version) and version != self._failed_version
+        return store, stale
+
+    def load(self):
+        """Builds the store of the CSV on disk if it changed. Blocking; the previous store serves meanwhile."""
+        with self._lock:
+            version = self.version_fn(self.path)
+            if version == "missing" or (self.store is not None and self.store.version == version):
+                return self.store
+            self.loading = True
+            try:
+                self.store = OpportunityStore.from_csv(self.path, version)
+                self.last_error = self._failed_version = None
+                print(f"✅ Opportunity store loaded: {len(self.store)} bargains ({version})")
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                self._failed_version = version
+                raise
+            finally:
+                self.loading = False
+            return self.store
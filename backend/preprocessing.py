@@ -1,5 +1,13 @@
 import pandas as pd
 import numpy as np
+from functools import lru_cache
+from scipy import sparse
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
 
 # ==========================================
 # 📊 FEATURE LISTS (CONFIGURATION)
@@ -37,6 +45,30 @@ REVIEWS = [
     'last_review', 'reviews_per_month'
 ]
 
+# Dates inside REVIEWS: left missing by clean_airbnb_data (no -1 fill)
+REVIEW_DATES = ['first_review', 'last_review']
+
+# Columns imputed with the median of listings with the same 'accommodates'
+GROUPED_IMPUTATION = ["bedrooms", "bathrooms", "beds"]
+
+# Listings missing any of these are dropped as "ghost hosts"
+HOST_REQUIRED = ['host_since', 'host_has_profile_pic', 'host_identity_verified']
+
+# Key coordinates in Madrid (Points Of Interest)
+MADRID_POIS = {
+    'sol': (40.4168, -3.7038),           # Center
+    'bernabeu': (40.4530, -3.6883),      # Real Madrid / Finance zone
+    'metropolitano': (40.4361, -3.5995), # Atlético de Madrid
+    'atocha': (40.4065, -3.6908),        # Train principal station (AVE)
+    'aeropuerto': (40.4839, -3.5680)     # Barajas Airport
+}
+
+# POIs computed by prepare_for_modeling (Sol is already computed by clean_airbnb_data)
+MODELING_POIS = ['bernabeu', 'metropolitano', 'atocha', 'aeropuerto']
+
+# Earth Radius
+EARTH_RADIUS_KM = 6371.0
+
 # ==========================================
 # PREPROCESSING FUNCTIONS
 # ==========================================
@@ -67,34 +99,188 @@ def calculate_haversine_distance(lat1, lon1, lat2, lon2):
     return distance
 
 
+@lru_cache(maxsize=None)
+def _poi_trig(poi_names):
+    # Per-POI trigonometry, computed once per set of POIs
+    coords = np.array([MADRID_POIS[name] for name in poi_names], dtype=float)
+    lat_rad = np.radians(coords[:, 0])
+    lon_rad = np.radians(coords[:, 1])
+    return lat_rad, lon_rad, np.cos(lat_rad)
+
+
+def calculate_poi_distances(lat, lon, poi_names=None):
+    """
+    Haversine distance (km) from every point to every POI of the registry in one vectorized pass.
+    Returns an (N, P) matrix with the POIs in the order of poi_names (default: all of MADRID_POIS).
+    Same formula as calculate_haversine_distance, so the values are identical.
+    """
+    poi_names = tuple(poi_names) if poi_names is not None else tuple(MADRID_POIS)
+    poi_lat, poi_lon, poi_cos = _poi_trig(poi_names)
+
+    # Listing trigonometry, once per point (column vectors broadcast against the POIs)
+    lat_rad = np.radians(np.asarray(lat, dtype=float)).reshape(-1, 1)
+    lon_rad = np.radians(np.asarray(lon, dtype=float)).reshape(-1, 1)
+
+    dlat = poi_lat - lat_rad
+    dlon = poi_lon - lon_rad
+    a = np.sin(dlat / 2)**2 + np.cos(lat_rad) * poi_cos * np.sin(dlon / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+
+def add_poi_distances(df: pd.DataFrame, poi_names, lat_col='latitude', lon_col='longitude'):
+    """Writes one 'distance_to_{poi}_km' column per POI into df (in place)."""
+    distances = calculate_poi_distances(df[lat_col].to_numpy(), df[lon_col].to_numpy(), poi_names)
+    for i, poi_name in enumerate(poi_names):
+        df[f'distance_to_{poi_name}_km'] = distances[:, i]
+    return df
+
+
+# ==========================================
+# 🛋️ AMENITIES (TOKENIZER + SPARSE MATRIX)
+# ==========================================
+# Binary features derived from the amenity vocabulary: regex matched against every amenity (lower case).
+# Adding a feature is one more entry here, not one more scan of the amenities text.
+# The trained model was fit on these exact patterns: changing one (e.g. 'ac' also matches
+# 'backyard') changes the feature, so it goes with a retrain and a new artifact version
+AMENITY_FLAGS = {
+    'has_ac': r'air conditioning|ac',
+    'has_pool': r'pool',
+    'has_elevator': r'elevator',
+    'has_parking': r'parking|garage',
+}
+
+# The amenities come as a JSON list: ["Wifi", "Air conditioning", ...]
+AMENITY_TRIM = '[]" '
+AMENITY_SEPARATOR = '", "'
+
+
+def tokenize_amenities(amenities: pd.Series):
+    """
+    Splits the amenity list of every listing in a single vectorized pass.
+    Returns (matrix, vocabulary): a CSR listings x amenities 0/1 matrix (int8)
+    and the amenity name of each of its columns: lower case, JSON escapes left as they are
+    in the file (the same text the flags were always matched against).
+    """
+    if pa is not None:
+        # Arrow kernels: trim, split and dictionary-encode without Python lists
+        text = pa.array(amenities, type=pa.string(), from_pandas=True)  # NaN -> null -> no amenities
+        if isinstance(text, pa.ChunkedArray):
+            text = text.combine_chunks()
+        lists = pc.split_pattern(pc.utf8_trim(text, AMENITY_TRIM), AMENITY_SEPARATOR)
+        encoded = pc.dictionary_encode(pc.list_flatten(lists))
+        rows = pc.list_parent_indices(lists).to_numpy(zero_copy_only=False)
+        codes = encoded.indices.to_numpy(zero_copy_only=False)
+        raw_tokens = encoded.dictionary.to_pylist()
+    else:
+        lists = amenities.str.strip(AMENITY_TRIM).str.split(AMENITY_SEPARATOR)
+        tokens = lists.set_axis(np.arange(len(lists))).explode().dropna()  # index = row position
+        rows = tokens.index.to_numpy()
+        codes, raw_tokens = pd.factorize(tokens)
+
+    # Lower case on the vocabulary only ('Wifi' and 'wifi' end up in the same column)
+    names = pd.Series([t.lower() for t in raw_tokens], dtype=object)
+    name_codes, vocabulary = pd.factorize(names)
+    codes = name_codes[codes]
+
+    # '[]' gives one empty token: not an amenity
+    is_amenity = np.asarray(vocabulary) != ''
+    present = is_amenity[codes]
+    rows, codes = rows[present], (np.cumsum(is_amenity) - 1)[codes[present]]
+    vocabulary = vocabulary[is_amenity]
+
+    # Rows come sorted: the CSR row pointers are just the cumulative token counts
+    indptr = np.zeros(len(amenities) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(amenities)), out=indptr[1:])
+    matrix = sparse.csr_matrix(
+        (np.ones(len(codes), dtype=np.int8), codes, indptr), shape=(len(amenities), len(vocabulary))
+    )
+    # An amenity listed twice is still a 1
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix, list(vocabulary)
+
+
+def amenity_flags(matrix, vocabulary, flags=None) -> dict:
+    """{feature: 0/1 array per listing}, 1 if any amenity of the listing matches the regex."""
+    flags = AMENITY_FLAGS if flags is None else flags
+    vocabulary = pd.Series(vocabulary, dtype=object)
+    result = {}
+    for name, pattern in flags.items():
+        hits = np.flatnonzero(vocabulary.str.contains(pattern, regex=True).to_numpy(dtype=bool))
+        result[name] = (np.asarray(matrix[:, hits].sum(axis=1)).ravel() > 0).astype(int)
+    return result
+
+
+def parse_price(price: pd.Series) -> pd.Series:
+    """'$1,234.00' -> 1234.0 (already numeric prices are returned as they are)."""
+    if not pd.api.types.is_numeric_dtype(price): # If it's a string/object
+        price = price.str.replace(r'[\$,]', '', regex=True).astype(float)
+    return price
+
+
 # ==========================================
 # ⚙️ MAIN PREPROCESSING FUNCTION
 # ==========================================
 
-def clean_airbnb_data(df: pd.DataFrame) -> pd.DataFrame:
+def clean_airbnb_data(df: pd.DataFrame, imputation_stats: dict = None, inplace: bool = False) -> pd.DataFrame:
     """
     Takes the raw Airbnb DataFrame and executes all business rules for 
     data cleaning and missing value imputation.
     Safe for both training and inference environments.
+    If imputation_stats (see collect_imputation_stats) is given, the medians are
+    taken from it instead of being computed on df (streaming mode).
+    inplace=True modifies df itself (no copies, one row filter and one column drop)
+    and returns it: the raw frame can't be used afterwards. Needs a unique index.
     """
-    # Work on a copy to avoid altering the original DataFrame in memory
-    df_clean = df.copy()
+    if not inplace:
+        # Work on a copy to avoid altering the original DataFrame in memory
+        df_clean = df.copy()
+        df_clean = _clean_before_imputation(df_clean)
+    else:
+        # Column drops are collected and applied once at the end
+        drops = []
+        df_clean = _clean_before_imputation(df, drops)
+
+    if imputation_stats is None:
+        df_clean = _impute_grouped_medians(df_clean)
+    else:
+        df_clean = _impute_with_stats(df_clean, imputation_stats)
+
+    if not inplace:
+        return _clean_after_imputation(df_clean)
+    _clean_after_imputation(df_clean, drops)
+    df_clean.drop(columns=drops, inplace=True)
+    return df_clean
 
+
+def _clean_before_imputation(df_clean: pd.DataFrame, drops: list = None) -> pd.DataFrame:
+    """
+    Steps 0-7 of clean_airbnb_data (row filters and column parsing).
+    drops: in-place mode, the columns to drop are appended to it instead of dropped.
+    """
     # 0. Drop unnecessary noise columns
-    df_clean = df_clean.drop(columns=COLUMNS_TO_DROP)
+    if drops is None:
+        # errors='ignore': the columnar ingest (ingest.py) doesn't even read them
+        df_clean = df_clean.drop(columns=COLUMNS_TO_DROP, errors='ignore')
+    else:
+        drops.extend(c for c in COLUMNS_TO_DROP if c in df_clean.columns)
 
     # 1. Target (Price): Remove '$' and ',' symbols, then drop nulls
     if 'price' in df_clean.columns:
-        if df_clean['price'].dtype == 'O': # If it's a string/object
-            df_clean['price'] = df_clean['price'].str.replace(r'[\$,]', '', regex=True).astype(float)
-        df_clean = df_clean.dropna(subset=['price'])
+        df_clean['price'] = parse_price(df_clean['price'])
+        if drops is None:
+            df_clean = df_clean.dropna(subset=['price'])
 
     # 2. Reviews: Create 'has_reviews' flag and fill nulls with -1
     if 'reviews_per_month' in df_clean.columns:
         df_clean['has_reviews'] = df_clean['reviews_per_month'].notna().astype(int)
     
     for col in REVIEWS:
-        if col in df_clean.columns:
+        # Review dates stay missing (NaN on the raw CSV, NaT if ingest.py parsed them):
+        # prepare_for_modeling turns both into days_since_* = -1. A -1 here became
+        # 1970-01-01 in pd.to_datetime whenever the column started with a missing date
+        if col in df_clean.columns and col not in REVIEW_DATES:
             df_clean[col] = df_clean[col].fillna(-1)
 
     # 3. Host Response Time: Fill nulls with 'Unknown'
@@ -105,13 +291,22 @@ def clean_airbnb_data(df: pd.DataFrame) -> pd.DataFrame:
     rates_cols = ['host_response_rate', 'host_acceptance_rate']
     for col in rates_cols:
         if col in df_clean.columns:
-            df_clean[col] = df_clean[col].astype(str).str.replace('%', '', regex=False)
-            df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce').fillna(-1)
+            rates = df_clean[col]
+            if not pd.api.types.is_numeric_dtype(rates):
+                rates = rates.str.replace('%', '', regex=False)
+            df_clean[col] = pd.to_numeric(rates, errors='coerce').fillna(-1)
 
     # 5. Drop "Ghost Hosts" (Missing critical host data)
-    host_dropna_cols = ['host_since', 'host_has_profile_pic', 'host_identity_verified']
-    host_present_columns = [c for c in host_dropna_cols if c in df_clean.columns]
-    df_clean = df_clean.dropna(subset=host_present_columns)
+    host_present_columns = [c for c in HOST_REQUIRED if c in df_clean.columns]
+    if drops is None:
+        df_clean = df_clean.dropna(subset=host_present_columns)
+    else:
+        # Single row filter for the price nulls (step 1) and the ghost hosts
+        if 'price' in df_clean.columns:
+            host_present_columns.append('price')
+        missing = df_clean[host_present_columns].isna().any(axis=1)
+        if missing.any():
+            df_clean.drop(index=df_clean.index[missing], inplace=True)
 
     # 6. Booleans: Fill nulls with 'f' and map everything to 1/0
     bool_fillna_f = ['host_is_superhost', 'has_availability']
@@ -126,14 +321,30 @@ def clean_airbnb_data(df: pd.DataFrame) -> pd.DataFrame:
 
     # 7. Extract numeric values from bathrooms_text
     if 'bathrooms_text' in df_clean.columns:
-        # Extract the first float found in the string
-        df_clean['bathrooms'] = df_clean['bathrooms_text'].str.extract(r'(\d+\.?\d*)').astype(float)
-        df_clean = df_clean.drop(columns=['bathrooms_text'])
+        bathrooms = _bathrooms_from_text(df_clean['bathrooms_text'])
+        if drops is None:
+            df_clean['bathrooms'] = bathrooms
+            df_clean = df_clean.drop(columns=['bathrooms_text'])
+        else:
+            # The original empty 'bathrooms' is replaced now (the new one goes at the end)
+            if 'bathrooms' in drops:
+                drops.remove('bathrooms')
+                del df_clean['bathrooms']
+            df_clean['bathrooms'] = bathrooms
+            drops.append('bathrooms_text')
+
+    return df_clean
 
+
+def _bathrooms_from_text(bathrooms_text: pd.Series) -> pd.Series:
+    # Extract the first float found in the string
+    return bathrooms_text.str.extract(r'(\d+\.?\d*)', expand=False).astype(float)
+
+
+def _impute_grouped_medians(df_clean: pd.DataFrame) -> pd.DataFrame:
     # 8. Grouped Imputation (based on 'accommodates' capacity)
-    global_imp = ["bedrooms", "bathrooms", "beds"]
     if 'accommodates' in df_clean.columns:
-        for col in global_imp:
+        for col in GROUPED_IMPUTATION:
             if col in df_clean.columns:
                 # Attempt 1: Group median based on how many people the listing accommodates
                 df_clean[col] = df_clean[col].fillna(
@@ -141,52 +352,200 @@ def clean_airbnb_data(df: pd.DataFrame) -> pd.DataFrame:
                 )
                 # Attempt 2: Global median fallback if the entire group was null
                 df_clean[col] = df_clean[col].fillna(df_clean[col].median())
-                
+
+    return df_clean
+
+
+def _clean_after_imputation(df_clean: pd.DataFrame, drops: list = None) -> pd.DataFrame:
+    """Steps 9-10 of clean_airbnb_data (feature engineering)."""
     # ==========================================
     # 9. CATEGORICAL VARIABLES AND TEXT
     # ==========================================
         
     # Extract "Premium Features" from Amenities (Feature Engineering)
     if 'amenities' in df_clean.columns:
-        # Lower case
-        amenities_str = df_clean['amenities'].str.lower()
+        # Tokenize once, then every flag is a lookup over the (small) vocabulary
+        matrix, vocabulary = tokenize_amenities(df_clean['amenities'])
         
-        # Use Regex + Binary column (1/0)
-        df_clean['has_ac'] = amenities_str.str.contains(r'air conditioning|ac').astype(int)
-        df_clean['has_pool'] = amenities_str.str.contains(r'pool').astype(int)
-        df_clean['has_elevator'] = amenities_str.str.contains(r'elevator').astype(int)
-        df_clean['has_parking'] = amenities_str.str.contains(r'parking|garage').astype(int)
+        # Binary columns (1/0)
+        for name, values in amenity_flags(matrix, vocabulary).items():
+            df_clean[name] = values
         
         # Drop original column
-        df_clean = df_clean.drop(columns=['amenities'])
+        if drops is None:
+            df_clean = df_clean.drop(columns=['amenities'])
+        else:
+            drops.append('amenities')
     
 
     # 10. Geospatial engineering: Distance to Puerta del Sol
     if 'latitude' in df_clean.columns and 'longitude' in df_clean.columns:
-        # Coordinates of Puerta del Sol (Madrid)
-        SOL_LAT = 40.4168
-        SOL_LON = -3.7038
-        
-        df_clean['distance_to_sol_km'] = calculate_haversine_distance(
-            df_clean['latitude'], 
-            df_clean['longitude'], 
-            SOL_LAT, 
-            SOL_LON
-        )
+        add_poi_distances(df_clean, ['sol'])
+
+    return df_clean
+
+
+# ==========================================
+# 🌊 STREAMING MODE (data larger than RAM)
+# ==========================================
+
+def _median_from_counts(counts: dict) -> float:
+    # Exact median from a {value: count} histogram (same result as pandas .median())
+    if not counts:
+        return np.nan
+    values = sorted(counts)
+    weights = np.array([counts[v] for v in values])
+    cum = np.cumsum(weights)
+    n = cum[-1]
+    lower = values[np.searchsorted(cum, (n - 1) // 2, side='right')]
+    upper = values[np.searchsorted(cum, n // 2, side='right')]
+    return (lower + upper) / 2 if n % 2 == 0 else float(upper)
+
+
+def _accumulate_imputation_counts(df_clean: pd.DataFrame, counts: dict):
+    """Adds the value histograms of one (pre-imputation) chunk to counts, in place."""
+    if 'accommodates' not in df_clean.columns:
+        return
+    for col in GROUPED_IMPUTATION:
+        if col not in df_clean.columns:
+            continue
+        col_counts = counts.setdefault(col, {'values': {}, 'nulls': {}})
+
+        # Non-null values per accommodates group (NaN groups still count for the global median)
+        present = df_clean[['accommodates', col]].dropna(subset=[col])
+        for (acc, value), n in present.groupby(['accommodates', col], dropna=False).size().items():
+            group = col_counts['values'].setdefault(acc, {})
+            group[value] = group.get(value, 0) + int(n)
+
+        # Nulls per accommodates group (they get the group median, if the group has one)
+        missing = df_clean.loc[df_clean[col].isna(), 'accommodates']
+        for acc, n in missing.value_counts(dropna=False).items():
+            col_counts['nulls'][acc] = col_counts['nulls'].get(acc, 0) + int(n)
+
+
+def _finalize_imputation_stats(counts: dict) -> dict:
+    stats = {}
+    for col, col_counts in counts.items():
+        # Attempt 1: group medians (NaN accommodates never forms a group, like groupby)
+        group_medians = {
+            acc: _median_from_counts(values)
+            for acc, values in col_counts['values'].items() if not pd.isna(acc)
+        }
+
+        # Attempt 2: global median of the column *after* the group imputation
+        global_counts = {}
+        for values in col_counts['values'].values():
+            for value, n in values.items():
+                global_counts[value] = global_counts.get(value, 0) + n
+        for acc, n in col_counts['nulls'].items():
+            median = group_medians.get(acc, np.nan)
+            if not pd.isna(median):
+                global_counts[median] = global_counts.get(median, 0) + n
+
+        stats[col] = {'group_medians': group_medians, 'global_median': _median_from_counts(global_counts)}
+    return stats
+
+
+def collect_imputation_stats(chunks) -> dict:
+    """
+    Pass 1 of the streaming mode: exact grouped/global medians from an iterable of raw chunks.
+    Only value histograms are kept in memory (bedrooms/bathrooms/beds have few distinct values).
+    """
+    counts = {}
+    for chunk in chunks:
+        # In-place mode (drops are never applied): the chunk is thrown away afterwards
+        _accumulate_imputation_counts(_clean_before_imputation(chunk, []), counts)
+    return _finalize_imputation_stats(counts)
+
 
+def _impute_with_stats(df_clean: pd.DataFrame, imputation_stats: dict) -> pd.DataFrame:
+    # 8. Grouped Imputation with frozen statistics (streaming mode)
+    if 'accommodates' in df_clean.columns:
+        for col, col_stats in imputation_stats.items():
+            if col in df_clean.columns:
+                df_clean[col] = df_clean[col].fillna(_median_fill(df_clean['accommodates'], col_stats))
     return df_clean
 
 
-def prepare_for_modeling(df_clean: pd.DataFrame) -> pd.DataFrame:
+def _median_fill(accommodates: pd.Series, col_stats: dict) -> pd.Series:
+    # Group median of each row, global median if its group has none
+    return accommodates.map(col_stats['group_medians']).fillna(col_stats['global_median'])
+
+
+def dropped_rows(df_raw: pd.DataFrame) -> np.ndarray:
+    """Raw rows that clean_airbnb_data filters out (null price, step 1, or ghost host, step 5)."""
+    dropped = df_raw[[c for c in HOST_REQUIRED if c in df_raw.columns]].isna().any(axis=1)
+    if 'price' in df_raw.columns:
+        dropped |= parse_price(df_raw['price']).isna()
+    return dropped.to_numpy()
+
+
+def imputed_values(df_raw: pd.DataFrame, imputation_stats: dict) -> dict:
+    """
+    {column: value that _impute_with_stats gives each raw row}, NaN where the row has its own
+    value. Raw columns only: no cleaning step runs.
+    """
+    values = {}
+    if 'accommodates' not in df_raw.columns:
+        return values
+    for col, col_stats in imputation_stats.items():
+        if col == 'bathrooms' and 'bathrooms_text' in df_raw.columns:
+            own = _bathrooms_from_text(df_raw['bathrooms_text'])
+        elif col in df_raw.columns:
+            own = df_raw[col]
+        else:
+            continue
+        fill = _median_fill(df_raw['accommodates'], col_stats).to_numpy(dtype=float)
+        values[col] = np.where(own.isna().to_numpy(), fill, np.nan)
+    return values
+
+
+def clean_airbnb_data_streaming(csv_path: str, chunksize: int = 100_000, n_jobs: int = 1, **read_csv_kwargs):
+    """
+    Two-pass, bounded-memory version of clean_airbnb_data for CSVs larger than RAM.
+    Pass 1 reads the file in chunks and collects the imputation statistics; pass 2 cleans
+    every chunk with those frozen statistics (across n_jobs processes if n_jobs > 1).
+    Yields the cleaned chunks in file order; pd.concat of them equals clean_airbnb_data(pd.read_csv(csv_path)).
+    """
+    stats = collect_imputation_stats(pd.read_csv(csv_path, chunksize=chunksize, **read_csv_kwargs))
+    chunks = pd.read_csv(csv_path, chunksize=chunksize, **read_csv_kwargs)
+
+    if n_jobs <= 1:
+        for chunk in chunks:
+            # Every chunk is a fresh frame owned by this loop: clean it in place
+            yield clean_airbnb_data(chunk, imputation_stats=stats, inplace=True)
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    # At most 2 chunks per worker in flight, so memory stays bounded
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(clean_airbnb_data, chunk, stats, True))
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def prepare_for_modeling(df_clean: pd.DataFrame, inplace: bool = False, model_columns=None) -> pd.DataFrame:
     """
     Takes the DataFrame cleaned and makes transformations and feature engineering in order to 
     feed the model our data in the right format.
+    inplace=True turns df_clean itself into the model frame (no copies) and returns it.
+    model_columns fixes the One-Hot columns to the model's (for chunks, that may miss categories):
+    categories without a column (the baseline, unseen ones) are all zeros.
     """
-    df_model = df_clean.copy()
+    df_model = df_clean if inplace else df_clean.copy()
+
+    # Every column drop is collected and applied once at the end
+    drops = []
     
     # Listing url as index
     if 'listing_url' in df_model.columns:
-        df_model = df_model.set_index('listing_url')
+        df_model.set_index('listing_url', inplace=True)
 
     # ==========================================
     # 0. Dates treatment (Dates -> Integers)
@@ -199,23 +558,19 @@ def prepare_for_modeling(df_clean: pd.DataFrame) -> pd.DataFrame:
     for col in date_cols:
         if col in df_model.columns:
             # Force dates
-            df_model[col] = pd.to_datetime(df_model[col], errors='coerce')
+            dates = pd.to_datetime(df_model[col], errors='coerce')
             
-            # Calculate days of difference
-            df_model[f'days_since_{col}'] = (reference_date - df_model[col]).dt.days
-            
-            # If null -> fillna with -1
-            df_model[f'days_since_{col}'] = df_model[f'days_since_{col}'].fillna(-1).astype(int)
+            # Calculate days of difference (if null -> fillna with -1)
+            df_model[f'days_since_{col}'] = (reference_date - dates).dt.days.fillna(-1).astype(int)
             
             # Drop the original column
-            df_model = df_model.drop(columns=[col])
+            drops.append(col)
 
     # ==========================================
     # 1. Drop noise and non-predictive columns
     # ==========================================
     cols_to_drop = ['property_type', 'neighbourhood_cleansed'] 
-    present_cols = [c for c in cols_to_drop if c in df_model.columns]
-    df_model = df_model.drop(columns=present_cols)
+    drops.extend(c for c in cols_to_drop if c in df_model.columns)
 
     # ==========================================
     # 2. Ordinal Encoding: host_response_time
@@ -236,32 +591,31 @@ def prepare_for_modeling(df_clean: pd.DataFrame) -> pd.DataFrame:
     cols_to_dummy = ['neighbourhood_group_cleansed', 'room_type']
     present_dummies = [c for c in cols_to_dummy if c in df_model.columns]
     
-    if present_dummies:
+    for col in present_dummies:
         # EL TRUCO: dtype=int fuerza que salgan 0 y 1 en lugar de False y True
-        df_model = pd.get_dummies(df_model, columns=present_dummies, drop_first=True, dtype=int)
+        # One column at a time: same columns/order as pd.get_dummies(df_model, ...) without rebuilding the frame
+        values = df_model[col]
+        if model_columns is not None:
+            categories = [c[len(col) + 1:] for c in model_columns if c.startswith(f'{col}_')]
+            dummies = pd.get_dummies(values.astype(pd.CategoricalDtype(categories)), prefix=col, dtype=int)
+        else:
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # Typed ingest: only the categories present, like with plain strings
+                values = values.cat.remove_unused_categories()
+            dummies = pd.get_dummies(values, prefix=col, drop_first=True, dtype=int)
+        for dummy_col in dummies.columns:
+            df_model[dummy_col] = dummies[dummy_col]
+        drops.append(col)
         
     # ==========================================
     # 4. Feature engineering (GEOSPATIAL)
     # ==========================================
-    if 'latitude' in df_clean.columns and 'longitude' in df_clean.columns:
-        # Key coordinates in Madrid
-        madrid_pois = {
-            #'sol': (40.4168, -3.7038),          # Center
-            'bernabeu': (40.4530, -3.6883),      # Real Madrid / Finance zone
-            'metropolitano': (40.4361, -3.5995), # Atlético de Madrid
-            'atocha': (40.4065, -3.6908),        # Train principal station (AVE)
-            'aeropuerto': (40.4839, -3.5680)     # Barajas Airport
-        }
-        
-        # Calculate distance to each apartment
-        for poi_name, coords in madrid_pois.items():
-            poi_lat, poi_lon = coords
-            df_clean[f'distance_to_{poi_name}_km'] = calculate_haversine_distance(
-                df_clean['latitude'], 
-                df_clean['longitude'], 
-                poi_lat, 
-                poi_lon
-            )
+    # In place, df_clean *is* the model frame: the distances would become model inputs, so they are skipped
+    if not inplace and 'latitude' in df_clean.columns and 'longitude' in df_clean.columns:
+        # Distance of each apartment to every POI in one pass.
+        # NOTE: written into df_clean (not df_model) as the trained model expects:
+        # model_columns.joblib doesn't include these 4 columns
+        add_poi_distances(df_clean, MODELING_POIS)
         
     # ==========================================
     # 5. Feature engineering
@@ -278,4 +632,5 @@ def prepare_for_modeling(df_clean: pd.DataFrame) -> pd.DataFrame:
     if 'availability_30' in df_model.columns:
         df_model['occupancy_rate_30d'] = (30 - df_model['availability_30']) / 30
 
+    df_model.drop(columns=drops, inplace=True)
     return df_model
\ No newline at end of file
@@ -0,0 +1,320 @@
+"""
+Opportunity scoring job (replaces notebooks/03_generate_oportunities.ipynb).
+
+Scores every listing with the pricing model and writes the bargains (predicted price above
+the actual one) to chollos_madrid.csv for the frontend:
+  1. Ingest listings.csv (columnar cache, see ingest.py)
+  2. Imputation statistics over the whole dataset (same medians as the in-memory pipeline)
+  3. Clean + prepare + predict chunk by chunk in a process pool (model loaded once per worker)
+  4. Residual / discount, then an atomic write of the CSV
+
+With --incremental, a store keeps a fingerprint of every listing's raw columns and its last
+prediction (or a "filtered" marker for the listings clean_airbnb_data drops): only new or
+changed listings go through step 3. The store is thrown away when the model or
+model_columns change; when an imputation median changes, only the listings imputed with it
+are scored again. Price changes alone never trigger a re-prediction (the price is not a
+model input). The days_since_* features of reused predictions stay as of the day they were
+computed.
+
+Usage:
+    python score_opportunities.py --input ../data/listings.csv --output ../data/chollos_madrid.csv --workers 4
+    python score_opportunities.py --incremental
+"""
+import argparse
+import hashlib
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from ingest import file_hash, load_listings
+from preprocessing import (clean_airbnb_data, collect_imputation_stats, dropped_rows, imputed_values,
+                           parse_price, prepare_for_modeling)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "..", "data")
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+STORE_PATH = os.path.join(DATA_DIR, ".cache", "scoring_store.joblib")
+# Bump it when the store layout changes: old stores are not reused
+STORE_FORMAT = 2
+
+# Columns Streamlit needs to render the UI
+REQUIRED_COLUMNS = [
+    'listing_url',
+    'latitude', 'longitude',
+    'neighbourhood_group_cleansed', # District
+    'neighbourhood_cleansed',       # Neighborhood
+    'room_type', 'accommodates',
+    'price', 'predicted_price', 'residual', 'discount_pct'
+]
+
+# Readable columns taken as they are from the raw listings (clean_airbnb_data doesn't modify them)
+RAW_READABLE_COLUMNS = [
+    'listing_url', 'latitude', 'longitude', 'neighbourhood_group_cleansed',
+    'neighbourhood_cleansed', 'room_type', 'accommodates',
+]
+
+# Per worker process (loaded once by init_worker)
+_model = None
+_model_columns = None
+
+
+def init_worker(model_path, columns_path, threads=None):
+    global _model, _model_columns
+    if threads:
+        # Each worker gets its share of the cores (the boosters default to all of them)
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+    _model = joblib.load(model_path)
+    _model_columns = list(joblib.load(columns_path))
+
+    if threads and hasattr(_model, "get_params"):
+        n_jobs = {name: threads for name in _model.get_params(deep=True) if name.endswith("n_jobs")}
+        _model.set_params(**n_jobs)
+
+
+def chunk_frames(df, chunksize):
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+def score_chunk(chunk, imputation_stats):
+    """Clean + prepare + predict one chunk. Returns (readable frame with predicted_price, timings)."""
+    started = time.perf_counter()
+    df_clean = clean_airbnb_data(chunk.copy(), imputation_stats=imputation_stats, inplace=True)
+
+    # Readable columns are kept before prepare_for_modeling turns df_clean into the model frame
+    df_readable = df_clean[[c for c in REQUIRED_COLUMNS if c in df_clean.columns]].copy()
+    df_model = prepare_for_modeling(df_clean, inplace=True, model_columns=_model_columns)
+    X = df_model[_model_columns]
+    preprocessed = time.perf_counter()
+
+    df_readable['predicted_price'] = _model.predict(X) if len(X) else []
+    finished = time.perf_counter()
+    return df_readable, {"preprocess": preprocessed - started, "predict": finished - preprocessed}
+
+
+def find_bargains(df_scored):
+    """Residual = predicted - actual price. Keeps the bargains (residual > 0), best first."""
+    df_scored['residual'] = df_scored['predicted_price'] - df_scored['price']
+    df_bargains = df_scored[df_scored['residual'] > 0].copy()
+    df_bargains['discount_pct'] = (df_bargains['residual'] / df_bargains['predicted_price']) * 100
+
+    final_columns = [col for col in REQUIRED_COLUMNS if col in df_bargains.columns]
+    return df_bargains[final_columns].sort_values(by='residual', ascending=False)
+
+
+def write_atomic(df, output_path):
+    # Written next to the target and renamed: readers never see a half-written file
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# ==========================================
+# 🗃️ INCREMENTAL STORE
+# ==========================================
+
+def listing_fingerprints(df_raw) -> np.ndarray:
+    """64-bit hash per listing of every raw column except the price (not a model input)."""
+    columns = [c for c in df_raw.columns if c != 'price']
+    return pd.util.hash_pandas_object(df_raw[columns], index=False).to_numpy()
+
+
+def store_version(model_path, columns_path) -> str:
+    # Anything that changes the prediction of every listing invalidates the whole store
+    parts = [str(STORE_FORMAT), file_hash(model_path), file_hash(columns_path)]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def load_store(store_path, version):
+    """The store {"rows", "imputation_stats"} or None if missing/stale."""
+    if not os.path.exists(store_path):
+        return None
+    store = joblib.load(store_path)
+    if store.get("version") != version:
+        print("🔄 Model changed: scoring store invalidated")
+        return None
+    return store
+
+
+def save_store(store_path, version, rows, imputation_stats):
+    os.makedirs(os.path.dirname(os.path.abspath(store_path)), exist_ok=True)
+    tmp_path = f"{store_path}.{os.getpid()}.tmp"
+    joblib.dump({"version": version, "rows": rows, "imputation_stats": imputation_stats}, tmp_path)
+    os.replace(tmp_path, store_path)
+
+
+def stale_imputations(df_raw, old_stats, new_stats) -> np.ndarray:
+    """Rows with a column imputed with a median that changed between both statistics."""
+    stale = np.zeros(len(df_raw), dtype=bool)
+    old_values = imputed_values(df_raw, old_stats)
+    for col, new in imputed_values(df_raw, new_stats).items():
+        old = old_values.get(col, np.full(len(df_raw), np.nan))
+        stale |= ~((old == new) | (np.isnan(old) & np.isnan(new)))
+    return stale
+
+
+def reuse_predictions(df_raw, fingerprints, store, imputation_stats):
+    """
+    Splits the snapshot into listings whose stored state is still valid and listings to score.
+    Returns (df_reused: readable frame with the current price and predicted_price,
+    mask of rows to score, stored predicted_price per row: NaN if none or filtered).
+    """
+    to_score = np.ones(len(df_raw), dtype=bool)
+    predicted = np.full(len(df_raw), np.nan)
+    if store is None or 'listing_url' not in df_raw.columns:
+        return None, to_score, predicted
+
+    urls = df_raw['listing_url']
+    # Duplicated URLs are always scored again (no unambiguous match)
+    lookup = store["rows"].drop_duplicates('listing_url', keep=False).set_index('listing_url')
+    position = lookup.index.get_indexer(urls)
+    hit = (position >= 0) & ~urls.duplicated(keep=False).to_numpy()
+    hit[hit] = lookup['fingerprint'].to_numpy()[position[hit]] == fingerprints[hit]
+    filtered = np.zeros(len(df_raw), dtype=bool)
+    filtered[hit] = lookup['filtered'].to_numpy()[position[hit]]
+
+    # Predictions that used a median that changed since they were stored
+    scored = hit & ~filtered
+    scored[scored] = ~stale_imputations(df_raw[scored], store["imputation_stats"], imputation_stats)
+    predicted[scored] = lookup['predicted_price'].to_numpy()[position[scored]]
+
+    # Filtered listings only need scoring if their price is back (the host columns are fingerprinted)
+    still_filtered = hit & filtered
+    still_filtered[still_filtered] = dropped_rows(df_raw[still_filtered])
+
+    df_reused = df_raw.loc[scored, [c for c in RAW_READABLE_COLUMNS if c in df_raw.columns]].copy()
+    df_reused['price'] = parse_price(df_raw.loc[scored, 'price'])
+    df_reused['predicted_price'] = predicted[scored]
+    # Same row filter as clean_airbnb_data (the rest of its filters only depend on fingerprinted columns)
+    df_reused = df_reused.dropna(subset=['price'])
+    return df_reused[[c for c in REQUIRED_COLUMNS if c in df_reused.columns]], ~(scored | still_filtered), predicted
+
+
+def report(stage, rows, seconds, note=""):
+    rate = rows / seconds if seconds > 0 else float('inf')
+    print(f"   {stage:<12} {rows:>9} rows {seconds:>8.2f}s {rate:>12,.0f} rows/s {note}")
+
+
+def run(input_path, output_path, model_path, columns_path, workers=1, chunksize=5000, use_cache=True,
+        store_path=None):
+    started = time.perf_counter()
+    stage_times = {}
+
+    # 1. Ingest
+    t = time.perf_counter()
+    df_raw = load_listings(input_path, use_cache=use_cache)
+    stage_times["ingest"] = time.perf_counter() - t
+    n_raw = len(df_raw)
+
+    # 2. Imputation statistics of the whole dataset (chunks are then cleaned independently)
+    t = time.perf_counter()
+    imputation_stats = collect_imputation_stats(chunk.copy() for chunk in chunk_frames(df_raw, chunksize))
+    stage_times["stats"] = time.perf_counter() - t
+
+    # 3. Incremental mode: keep the stored predictions of the unchanged listings
+    df_reused = None
+    to_score = df_raw
+    if store_path:
+        t = time.perf_counter()
+        fingerprints = listing_fingerprints(df_raw)
+        version = store_version(model_path, columns_path)
+        df_reused, score_mask, predicted = reuse_predictions(df_raw, fingerprints, load_store(store_path, version),
+                                                             imputation_stats)
+        to_score = df_raw[score_mask]
+        stage_times["store"] = time.perf_counter() - t
+        print(f"🗃️ {n_raw - len(to_score)} listings unchanged, {len(to_score)} new, changed or re-imputed")
+
+    # 4. Score the chunks (results come back in order)
+    t = time.perf_counter()
+    n_to_score = len(to_score)
+    chunks = chunk_frames(to_score, chunksize)
+    worker_times = {"preprocess": 0.0, "predict": 0.0}
+    if n_to_score == 0:
+        results = []
+    elif workers > 1:
+        threads = max((os.cpu_count() or 1) // workers, 1)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(model_path, columns_path, threads)) as pool:
+            results = list(pool.map(score_chunk, chunks, itertools.repeat(imputation_stats)))
+    else:
+        init_worker(model_path, columns_path)
+        results = [score_chunk(chunk, imputation_stats) for chunk in chunks]
+    stage_times["scoring"] = time.perf_counter() - t
+
+    for _, timings in results:
+        for stage, seconds in timings.items():
+            worker_times[stage] += seconds
+    frames = [df for df, _ in results] + ([df_reused] if df_reused is not None else [])
+    # Back to the snapshot order (the raw index), whatever came from the store
+    df_scored = pd.concat(frames).sort_index() if frames else pd.DataFrame(columns=REQUIRED_COLUMNS)
+    n_scored = len(df_scored)
+    n_predicted = sum(len(df) for df, _ in results)
+
+    if store_path:
+        t = time.perf_counter()
+        # Every listing: stored or new prediction, otherwise dropped by clean_airbnb_data ("filtered")
+        for df, _ in results:
+            predicted[df_raw.index.get_indexer(df.index)] = df['predicted_price'].to_numpy()
+        stored = pd.DataFrame({
+            'listing_url': df_raw['listing_url'].to_numpy(),
+            'fingerprint': fingerprints,
+            'predicted_price': predicted,
+            'filtered': np.isnan(predicted),
+        })
+        save_store(store_path, version, stored, imputation_stats)
+        stage_times["store"] += time.perf_counter() - t
+    del df_raw
+
+    # 5. Bargains + atomic write
+    t = time.perf_counter()
+    df_export = find_bargains(df_scored)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    write_atomic(df_export, output_path)
+    stage_times["write"] = time.perf_counter() - t
+
+    total = time.perf_counter() - started
+    print(f"📊 Throughput ({workers} worker{'s' if workers > 1 else ''}, chunks of {chunksize}):")
+    report("ingest", n_raw, stage_times["ingest"])
+    report("stats", n_raw, stage_times["stats"])
+    # Worker stages: rows per second of one worker (summed worker time)
+    if store_path:
+        report("store", n_raw, stage_times["store"])
+    report("preprocess", n_to_score, worker_times["preprocess"], "(per worker)")
+    report("predict", n_predicted, worker_times["predict"], "(per worker)")
+    report("scoring", n_to_score, stage_times["scoring"], "(wall)")
+    report("write", n_scored, stage_times["write"])
+    report("total", n_raw, total)
+    print(f"✅ Success! Found {len(df_export)} bargains out of {n_scored} listings.")
+    print(f"File with {len(df_export.columns)} columns saved at: {output_path}")
+    return df_export
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every listing and export the bargains for the frontend")
+    parser.add_argument("--input", default=os.path.join(DATA_DIR, "listings.csv"))
+    parser.add_argument("--output", default=os.path.join(DATA_DIR, "chollos_madrid.csv"))
+    parser.add_argument("--model", default=os.path.join(MODELS_DIR, "airbnb_pricing_model.joblib"))
+    parser.add_argument("--columns", default=os.path.join(MODELS_DIR, "model_columns.joblib"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunksize", type=int, default=5000)
+    parser.add_argument("--no-cache", action="store_true", help="Parse listings.csv even if a cache exists")
+    parser.add_argument("--incremental", action="store_true", help="Only score new or changed listings")
+    parser.add_argument("--store", default=STORE_PATH, help="Prediction store of the incremental mode")
+    args = parser.parse_args()
+
+    run(args.input, args.output, args.model, args.columns,
+        workers=args.workers, chunksize=args.chunksize, use_cache=not args.no_cache,
+        store_path=args.store if args.incremental else None)
+
+
+if __name__ == '__main__':
+    main()
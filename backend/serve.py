@@ -0,0 +1,128 @@
+"""
+Pre-fork server for the API.
+
+The parent process imports main.py once (model + model_columns are loaded a single time),
+freezes the garbage collector so those objects are not touched again, and then forks N
+uvicorn workers that share the model pages copy-on-write and accept on the same socket.
+
+POST /admin/model/reload reaches a single worker: it writes the requested version to a file
+shared with the others and signals the parent, which forwards the signal to every worker, so
+all of them load and swap the same version (GET /admin/model reports the worker that answers).
+
+Usage:
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import os
+import signal
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+import uvicorn
+
+
+def run_worker(app, sock, log_level):
+    from main import RELOAD_SIGNAL  # already imported by the parent
+
+    # Restore default handlers, uvicorn installs its own for a graceful shutdown
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Ignored until the lifespan installs the app's handler (and reads any pending reload)
+    signal.signal(RELOAD_SIGNAL, signal.SIG_IGN)
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(app, sock, log_level):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(app, sock, log_level)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with N forked workers sharing one loaded model")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # 1. Load everything once in the parent
+    started = time.time()
+    import main as api
+    if api.model_slot.active is None:
+        sys.exit("❌ Model or columns not loaded, refusing to fork workers.")
+    print(f"✅ Model loaded once in parent {os.getpid()} ({time.time() - started:.2f}s)")
+
+    # 2. Move every object created so far to the permanent generation:
+    # the GC won't write to their headers, so the pages stay shared after fork
+    gc.collect()
+    gc.freeze()
+
+    # 3. Shared listening socket
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # 4. Reloads requested on any worker are broadcast to all of them through this file
+    reload_dir = tempfile.mkdtemp(prefix="airbnb-api-")
+    api.RELOAD_REQUEST_PATH = os.path.join(reload_dir, "model_reload.json")
+
+    workers = set()
+
+    def broadcast_reload(signum, frame):
+        for pid in workers:
+            try:
+                os.kill(pid, api.RELOAD_SIGNAL)
+            except ProcessLookupError:
+                pass
+
+    # Before forking: the default action of the signal would kill the parent
+    signal.signal(api.RELOAD_SIGNAL, broadcast_reload)
+
+    # 5. Fork the workers and keep them alive
+    workers.update(spawn(api.app, sock, args.log_level) for _ in range(args.workers))
+    print(f"🚀 Serving on http://{args.host}:{args.port} with {len(workers)} workers: {sorted(workers)}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"⚠️ Worker {pid} exited (status {status}), forking a replacement")
+            workers.add(spawn(api.app, sock, args.log_level))
+
+    sock.close()
+    shutil.rmtree(reload_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
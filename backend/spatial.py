@@ -0,0 +1,185 @@
+"""
+Spatial index over listing coordinates (radius, bounding-box and k-nearest queries).
+
+Grid bucket index built once when the data is loaded: points are sorted by grid cell
+(row-major), so the cells of one grid row inside a query box are a single contiguous
+slice of the sorted arrays. Queries only read those slices and run the exact test on them.
+Results are row positions of the indexed arrays, so callers can join any other column.
+
+Benchmark against a brute-force pandas scan:
+    python spatial.py --benchmark ../data/chollos_madrid.csv
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import EARTH_RADIUS_KM, calculate_haversine_distance
+
+EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000
+METERS_PER_DEGREE = np.radians(1) * EARTH_RADIUS_M
+# Web map tiles (256 px, Web Mercator): ground meters per screen pixel at zoom 0 on the equator
+METERS_PER_PIXEL_Z0 = 2 * np.pi * EARTH_RADIUS_M / 256
+
+
+class SpatialIndex:
+    def __init__(self, lat, lon, cell_m=250):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        self.size = len(lat)
+
+        # 1. Grid over the extent of the points (~cell_m x cell_m cells)
+        self.min_lat = float(lat.min()) if self.size else 0.0
+        self.min_lon = float(lon.min()) if self.size else 0.0
+        mid_lat = (self.min_lat + float(lat.max())) / 2 if self.size else 0.0
+        self.lat_step = cell_m / METERS_PER_DEGREE
+        self.lon_step = self.lat_step / max(np.cos(np.radians(mid_lat)), 1e-6)
+        self.n_rows = int((lat.max() - self.min_lat) // self.lat_step) + 1 if self.size else 1
+        self.n_cols = int((lon.max() - self.min_lon) // self.lon_step) + 1 if self.size else 1
+        self.cell_m = cell_m
+
+        # 2. Points sorted by cell + start offset of every cell
+        cells = self._row(lat) * self.n_cols + self._col(lon)
+        self.order = np.argsort(cells, kind="stable")
+        self.lat, self.lon = lat[self.order], lon[self.order]
+        self.starts = np.searchsorted(cells[self.order], np.arange(self.n_rows * self.n_cols + 1))
+
+    def __len__(self):
+        return self.size
+
+    def _row(self, lat):
+        return np.clip(((np.asarray(lat) - self.min_lat) // self.lat_step).astype(np.int64), 0, self.n_rows - 1)
+
+    def _col(self, lon):
+        return np.clip(((np.asarray(lon) - self.min_lon) // self.lon_step).astype(np.int64), 0, self.n_cols - 1)
+
+    def _candidates(self, min_lat, min_lon, max_lat, max_lon):
+        """Sorted-array slice bounds of the cells touching the box (one slice per grid row)."""
+        if not self.size:
+            return []
+        r0, r1 = self._row(min_lat), self._row(max_lat)
+        c0, c1 = self._col(min_lon), self._col(max_lon)
+        rows = np.arange(r0, r1 + 1) * self.n_cols
+        return [(a, b) for a, b in zip(self.starts[rows + c0], self.starts[rows + c1 + 1]) if b > a]
+
+    def _gather(self, slices):
+        if not slices:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+        sorted_idx = np.concatenate([np.arange(a, b) for a, b in slices])
+        return sorted_idx, self.lat[sorted_idx], self.lon[sorted_idx]
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Ascending positions of the points inside the box (e.g. the map viewport)."""
+        sorted_idx, lat, lon = self._gather(self._candidates(min_lat, min_lon, max_lat, max_lon))
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return np.sort(self.order[sorted_idx[inside]])
+
+    def radius(self, lat, lon, radius_m):
+        """(positions, distances in meters) of the points within radius_m, closest first."""
+        d_lat = radius_m / METERS_PER_DEGREE
+        d_lon = d_lat / max(np.cos(np.radians(min(abs(lat) + d_lat, 89.9))), 1e-6)
+        sorted_idx, cand_lat, cand_lon = self._gather(self._candidates(lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon))
+        distances = calculate_haversine_distance(lat, lon, cand_lat, cand_lon) * 1000
+        within = distances <= radius_m
+        sorted_idx, distances = sorted_idx[within], distances[within]
+        closest = np.argsort(distances, kind="stable")
+        return self.order[sorted_idx[closest]], distances[closest]
+
+    def nearest(self, lat, lon, k, keep=None):
+        """
+        (positions, distances in meters) of the k closest points, closest first.
+        keep: optional boolean mask over the positions (only those points are candidates).
+        """
+        k = min(k, self.size if keep is None else int(np.count_nonzero(keep)))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        # Growing radius until it holds k points (every point within the radius is found)
+        radius_m = self.cell_m
+        while True:
+            positions, distances = self.radius(lat, lon, radius_m)
+            if keep is not None:
+                kept = keep[positions]
+                positions, distances = positions[kept], distances[kept]
+            if len(positions) >= k:
+                return positions[:k], distances[:k]
+            radius_m *= 2
+
+
+def cluster_labels(lat, lon, zoom, cell_px=60):
+    """
+    Grid clustering for a map zoom level: points in the same cell of ~cell_px screen pixels
+    share a label. Cells are anchored at (0, 0), so they don't move with the data.
+    Returns (labels 0..n-1, n_clusters).
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if not len(lat):
+        return np.empty(0, dtype=np.int64), 0
+    cos_lat = max(np.cos(np.radians(float(np.mean(lat)))), 1e-6)
+    cell_m = cell_px * METERS_PER_PIXEL_Z0 * cos_lat / 2 ** zoom
+    lat_step = cell_m / METERS_PER_DEGREE
+    lon_step = lat_step / cos_lat
+    rows = np.floor(lat / lat_step).astype(np.int64)
+    cols = np.floor(lon / lon_step).astype(np.int64)
+    uniques, labels = np.unique(np.column_stack([rows, cols]), axis=0, return_inverse=True)
+    return labels.ravel(), len(uniques)
+
+
+def benchmark(csv_path, n_queries=200, radius_m=800, k=20, seed=0):
+    """Index vs brute-force pandas scan on random queries around the dataset. Checks both agree."""
+    df = pd.read_csv(csv_path, usecols=['latitude', 'longitude']).dropna()
+    started = time.perf_counter()
+    index = SpatialIndex(df['latitude'], df['longitude'])
+    build_ms = (time.perf_counter() - started) * 1000
+
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(df), n_queries)
+    queries = np.column_stack([df['latitude'].to_numpy()[picks], df['longitude'].to_numpy()[picks]])
+    queries += rng.normal(0, 0.003, queries.shape)
+    half = 0.01  # ~1 km viewport half-size
+
+    def brute_distances(lat, lon):
+        return calculate_haversine_distance(lat, lon, df['latitude'], df['longitude']) * 1000
+
+    timings = {name: [0.0, 0.0] for name in ("radius", "bbox", "nearest")}
+    for lat, lon in queries:
+        # Radius
+        t = time.perf_counter(); got, _ = index.radius(lat, lon, radius_m); timings["radius"][0] += time.perf_counter() - t
+        t = time.perf_counter(); dist = brute_distances(lat, lon); expected = np.flatnonzero(dist.to_numpy() <= radius_m); timings["radius"][1] += time.perf_counter() - t
+        # Points right on the border may fall on either side (different float formulas)
+        border = np.abs(dist.to_numpy() - radius_m) < 1e-6
+        assert set(got) ^ set(expected) <= set(np.flatnonzero(border)), "radius results differ"
+
+        # Bounding box
+        box = (lat - half, lon - half, lat + half, lon + half)
+        t = time.perf_counter(); got = index.bbox(*box); timings["bbox"][0] += time.perf_counter() - t
+        t = time.perf_counter()
+        expected = np.flatnonzero(df['latitude'].between(box[0], box[2]).to_numpy() & df['longitude'].between(box[1], box[3]).to_numpy())
+        timings["bbox"][1] += time.perf_counter() - t
+        assert np.array_equal(got, expected), "bbox results differ"
+
+        # k nearest
+        t = time.perf_counter(); _, got_dist = index.nearest(lat, lon, k); timings["nearest"][0] += time.perf_counter() - t
+        t = time.perf_counter(); expected_dist = brute_distances(lat, lon).nsmallest(k).to_numpy(); timings["nearest"][1] += time.perf_counter() - t
+        assert np.allclose(got_dist, expected_dist, atol=1e-3), "nearest results differ"
+
+    print(f"📊 {len(df)} points, {n_queries} queries (index built in {build_ms:.1f} ms)")
+    for name, (index_s, brute_s) in timings.items():
+        index_ms, brute_ms = index_s / n_queries * 1000, brute_s / n_queries * 1000
+        print(f"   {name:<8} index {index_ms:8.3f} ms | brute force {brute_ms:8.3f} ms | x{brute_ms / index_ms:,.0f}")
+    print("✅ Index and brute force return the same results")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the spatial index against a brute-force scan")
+    parser.add_argument("--benchmark", metavar="CSV", required=True, help="CSV with latitude/longitude columns")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius-m", type=float, default=800)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+    benchmark(args.benchmark, args.queries, args.radius_m, args.k)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import itertools
+import numpy as np
+
+
+def expand_range(start, stop, step, max_values):
+    """Inclusive numeric range (e.g. review scores 4.0 -> 5.0 every 0.25)."""
+    n_values = int(np.floor((stop - start) / step + 1e-9)) + 1
+    if n_values < 1:
+        raise ValueError(f"Empty range: start={start}, stop={stop}, step={step}")
+    if n_values > max_values:
+        raise ValueError(f"Range with {n_values} values (max {max_values} per axis)")
+    return [round(start + i * step, 6) for i in range(n_values)]
+
+
+def grid_size(axes):
+    return int(np.prod([len(values) for values in axes.values()])) if axes else 1
+
+
+def expand_grid(base, axes):
+    """
+    Cartesian product of the axes applied over the base PropertyData.
+    Axes values must be already validated: model_copy doesn't validate again.
+    Order is C-order (the last axis changes fastest), matching np.reshape.
+    """
+    names = list(axes)
+    return [
+        base.model_copy(update=dict(zip(names, combo)))
+        for combo in itertools.product(*(axes[name] for name in names))
+    ]
+
+
+def marginal_uplift(prices, reference_idx):
+    """
+    For every axis, average price change of moving that feature from its reference value
+    (the base property's value, or the first one) to each value, over the rest of the grid.
+    prices: array with one dimension per axis, in the same order as reference_idx.
+    """
+    uplift = []
+    for axis, ref in enumerate(reference_idx):
+        delta = prices - np.take(prices, [ref], axis=axis)
+        other_axes = tuple(a for a in range(prices.ndim) if a != axis)
+        uplift.append(delta.mean(axis=other_axes) if other_axes else delta)
+    return uplift
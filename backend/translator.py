@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+from preprocessing import MADRID_POIS, calculate_poi_distances
+
+# ==========================================
+# 📊 SIMULATED HOST DEFAULTS (CONFIGURATION)
+# ==========================================
+# Values that do not depend on the user input (mirrors build_feature_row in main.py)
+HOST_DEFAULTS = {
+    'host_has_profile_pic': 1,
+    'host_identity_verified': 1,
+    'instant_bookable': 1,
+    'has_availability': 1,
+    'host_response_time': 4,  # Ordinal: 4 means 'within an hour'
+    'host_response_rate': 100.0,
+    'host_acceptance_rate': 100.0,
+    'availability_30': 15,
+    'availability_60': 30,
+    'availability_90': 45,
+    'availability_365': 180,
+    'days_since_host_since': 365,
+    'occupancy_rate_30d': (30 - 15) / 30,
+}
+
+# Review columns: (value without reviews, value with reviews)
+REVIEW_DEFAULTS = {
+    'has_reviews': (0, 1),
+    'reviews_per_month': (-1, 1.5),
+    'days_since_first_review': (-1, 180),
+    'days_since_last_review': (-1, 15),
+    'review_scores_rating': (-1, np.nan),  # NaN -> taken from the user input
+    'review_scores_accuracy': (-1, 4.8),
+    'review_scores_cleanliness': (-1, 4.8),
+    'review_scores_checkin': (-1, 4.9),
+    'review_scores_communication': (-1, 4.9),
+    'review_scores_location': (-1, 4.8),
+    'review_scores_value': (-1, 4.7),
+}
+
+# User inputs copied as they are
+DIRECT_FIELDS = [
+    'latitude', 'longitude', 'accommodates', 'bedrooms', 'beds', 'bathrooms',
+    'has_ac', 'has_pool', 'has_elevator', 'has_parking', 'host_is_superhost',
+]
+
+
+# ==========================================
+# ⚙️ COMPILED TRANSLATOR
+# ==========================================
+
+class FeatureTemplate:
+    """
+    Translator compiled once from model_columns.joblib.
+    Holds a preallocated row with every constant already in place, so each request
+    only writes its variable fields into a copy of it.
+    """
+
+    def __init__(self, model_columns):
+        self.columns = list(model_columns)
+        self.index = {col: i for i, col in enumerate(self.columns)}
+
+        # 1. Base row with the constant defaults
+        self.base_row = np.zeros(len(self.columns), dtype=float)
+        for col, value in HOST_DEFAULTS.items():
+            if col in self.index:
+                self.base_row[self.index[col]] = value
+
+        # 2. Review block: slots + both variants of default values
+        review_cols = [c for c in REVIEW_DEFAULTS if c in self.index]
+        self.review_slots = np.array([self.index[c] for c in review_cols], dtype=int)
+        self.review_values = np.array([REVIEW_DEFAULTS[c] for c in review_cols], dtype=float).T  # (2, k)
+        self.rating_pos = review_cols.index('review_scores_rating') if 'review_scores_rating' in review_cols else None
+
+        # 3. Slots of the plain inputs and of the engineered features (None if the model doesn't use them)
+        self.direct_slots = [(f, self.index[f]) for f in DIRECT_FIELDS if f in self.index]
+        self.reviews_slot = self.index.get('number_of_reviews')
+        # POIs of the registry used by the model (distances computed together in one kernel call)
+        self.poi_names = [name for name in MADRID_POIS if f'distance_to_{name}_km' in self.index]
+        self.poi_slots = np.array([self.index[f'distance_to_{name}_km'] for name in self.poi_names], dtype=int)
+        self.per_bed_slot = self.index.get('accommodates_per_bed')
+        self.per_person_slot = self.index.get('bathrooms_per_person')
+
+        # 4. One-Hot slots (-1 = baseline category dropped by drop_first)
+        self.neighbourhood_slots = self._prefix_slots('neighbourhood_group_cleansed_')
+        self.room_type_slots = self._prefix_slots('room_type_')
+
+    def _prefix_slots(self, prefix):
+        return {col[len(prefix):]: i for col, i in self.index.items() if col.startswith(prefix)}
+
+    def transform_matrix(self, items) -> np.ndarray:
+        """Builds the (n_items, n_columns) feature matrix for a list of PropertyData."""
+        n = len(items)
+        X = np.tile(self.base_row, (n, 1))
+        if n == 0:
+            return X
+
+        # Direct inputs
+        for field, slot in self.direct_slots:
+            X[:, slot] = [getattr(item, field) for item in items]
+
+        # Reviews (the "-1" imputation logic)
+        n_reviews = np.array([item.number_of_reviews for item in items], dtype=float)
+        has_reviews = (n_reviews != 0).astype(int)
+        review_block = self.review_values[has_reviews]
+        if self.rating_pos is not None:
+            ratings = np.array([item.review_scores_rating for item in items], dtype=float)
+            review_block[:, self.rating_pos] = np.where(has_reviews == 1, ratings, -1)
+        X[:, self.review_slots] = review_block
+        if self.reviews_slot is not None:
+            X[:, self.reviews_slot] = n_reviews
+
+        # Geospatial features
+        lat = np.array([item.latitude for item in items], dtype=float)
+        lon = np.array([item.longitude for item in items], dtype=float)
+        if self.poi_names:
+            X[:, self.poi_slots] = calculate_poi_distances(lat, lon, self.poi_names)
+
+        # Mathematical features
+        accommodates = np.array([item.accommodates for item in items], dtype=float)
+        if self.per_bed_slot is not None:
+            beds = np.array([item.beds for item in items], dtype=float)
+            X[:, self.per_bed_slot] = accommodates / np.where(beds > 0, beds, 1)
+        if self.per_person_slot is not None:
+            bathrooms = np.array([item.bathrooms for item in items], dtype=float)
+            X[:, self.per_person_slot] = bathrooms / np.where(accommodates > 0, accommodates, 1)
+
+        # One-Hot Encoding
+        rows = np.arange(n)
+        for slots, attr in ((self.neighbourhood_slots, 'neighbourhood'), (self.room_type_slots, 'room_type')):
+            cols = np.array([slots.get(getattr(item, attr).value, -1) for item in items], dtype=int)
+            hit = cols >= 0
+            X[rows[hit], cols[hit]] = 1
+
+        return X
+
+    def transform_locations(self, item, lat, lon) -> np.ndarray:
+        """Feature matrix of one property profile placed at every (lat, lon) given (1D arrays)."""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        X = np.tile(self.transform_matrix([item])[0], (len(lat), 1))
+
+        # Only the geo features change from one location to another
+        for field, values in (('latitude', lat), ('longitude', lon)):
+            if field in self.index:
+                X[:, self.index[field]] = values
+        if self.poi_names:
+            X[:, self.poi_slots] = calculate_poi_distances(lat, lon, self.poi_names)
+        return X
+
+    def transform(self, items) -> pd.DataFrame:
+        return pd.DataFrame(self.transform_matrix(items), columns=self.columns)
+
+
+def check_parity(template: FeatureTemplate, reference_fn, samples, atol=1e-9):
+    """
+    Compares the compiled template against the dict-based reference translator.
+    Returns the list of samples whose feature rows differ (empty list = parity).
+    """
+    X = template.transform_matrix(samples)
+    mismatches = []
+    for row, sample in zip(X, samples):
+        expected = reference_fn(sample)
+        expected_row = np.array([expected[col] for col in template.columns], dtype=float)
+        if not np.allclose(row, expected_row, atol=atol, rtol=0):
+            mismatches.append(sample)
+    return mismatches
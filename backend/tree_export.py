@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import numpy as np
+
+# ==========================================
+# 📊 ARRAY LAYOUT (CONFIGURATION)
+# ==========================================
+# Every base learner is flattened into the same set of node arrays (all trees concatenated):
+#   feature       -> feature index of the split (-1 for leaves)
+#   threshold     -> split threshold
+#   left / right  -> global index of the children
+#   default_left  -> direction taken by missing values
+#   missing_type  -> 0 = NaN treated as 0.0, 1 = zero/NaN are missing, 2 = NaN is missing
+#   value         -> leaf value (0 for internal nodes)
+NODE_FIELDS = ['feature', 'threshold', 'left', 'right', 'default_left', 'missing_type', 'value']
+
+MISSING_AS_ZERO, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+ZERO_THRESHOLD = 1e-35  # LightGBM's kZeroThreshold
+
+
+# ==========================================
+# EXPORT (one function per library)
+# ==========================================
+
+def _export_sklearn_forest(est):
+    """RandomForest / ExtraTrees / DecisionTree: mean of the trees, x(float32) <= threshold."""
+    trees = getattr(est, 'estimators_', [est])
+    nodes = {f: [] for f in NODE_FIELDS}
+    roots, offset = [], 0
+    for t in trees:
+        tree = t.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        roots.append(offset)
+        nodes['feature'].append(np.where(is_leaf, -1, tree.feature))
+        nodes['threshold'].append(tree.threshold)
+        nodes['left'].append(np.where(is_leaf, -1, tree.children_left + offset))
+        nodes['right'].append(np.where(is_leaf, -1, tree.children_right + offset))
+        missing_left = getattr(tree, 'missing_go_to_left', np.zeros(n, dtype=bool))
+        nodes['default_left'].append(np.asarray(missing_left, dtype=bool))
+        nodes['missing_type'].append(np.full(n, MISSING_NAN))
+        nodes['value'].append(np.where(is_leaf, tree.value[:, 0, 0], 0.0))
+        offset += n
+    return _learner('sklearn_forest', nodes, roots, aggregate='mean', base=0.0, strict=False, float32=True)
+
+
+def _export_lightgbm(est):
+    """LGBMRegressor: sum of the trees, x <= threshold (double precision)."""
+    dump = est.booster_.dump_model()
+    if not str(dump.get('objective', '')).startswith('regression'):
+        raise ValueError(f"Unsupported LightGBM objective: {dump.get('objective')}")
+
+    nodes = {f: [] for f in NODE_FIELDS}
+    roots = []
+    missing_codes = {'None': MISSING_AS_ZERO, 'Zero': MISSING_ZERO, 'NaN': MISSING_NAN}
+
+    def add(node):
+        idx = len(nodes['feature'])
+        for f in NODE_FIELDS:
+            nodes[f].append(0)
+        if 'leaf_value' in node:
+            nodes['feature'][idx] = -1
+            nodes['left'][idx] = nodes['right'][idx] = -1
+            nodes['value'][idx] = node['leaf_value']
+            return idx
+        if node.get('decision_type', '<=') != '<=':
+            raise ValueError("Categorical LightGBM splits are not supported")
+        nodes['feature'][idx] = node['split_feature']
+        nodes['threshold'][idx] = node['threshold']
+        nodes['default_left'][idx] = node['default_left']
+        nodes['missing_type'][idx] = missing_codes[node.get('missing_type', 'None')]
+        nodes['left'][idx] = add(node['left_child'])
+        nodes['right'][idx] = add(node['right_child'])
+        return idx
+
+    for info in dump['tree_info']:
+        roots.append(add(info['tree_structure']))
+
+    aggregate = 'mean' if dump.get('average_output') else 'sum'
+    return _learner('lightgbm', {f: [np.asarray(v)] for f, v in nodes.items()}, roots,
+                    aggregate=aggregate, base=0.0, strict=False, float32=False)
+
+
+def _export_xgboost(est):
+    """XGBRegressor: base_score + sum of the trees, x(float32) < threshold."""
+    raw = json.loads(est.get_booster().save_raw('json'))
+    learner = raw['learner']
+    if learner['objective']['name'] not in ('reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror'):
+        raise ValueError(f"Unsupported XGBoost objective: {learner['objective']['name']}")
+    base_score = float(str(learner['learner_model_param']['base_score']).strip('[]'))
+
+    nodes = {f: [] for f in NODE_FIELDS}
+    roots, offset = [], 0
+    for tree in learner['gradient_booster']['model']['trees']:
+        left = np.asarray(tree['left_children'], dtype=int)
+        right = np.asarray(tree['right_children'], dtype=int)
+        cond = np.asarray(tree['split_conditions'], dtype=np.float32).astype(float)
+        is_leaf = left == -1
+        roots.append(offset)
+        nodes['feature'].append(np.where(is_leaf, -1, tree['split_indices']))
+        nodes['threshold'].append(np.where(is_leaf, 0.0, cond))
+        nodes['left'].append(np.where(is_leaf, -1, left + offset))
+        nodes['right'].append(np.where(is_leaf, -1, right + offset))
+        nodes['default_left'].append(np.asarray(tree['default_left'], dtype=bool))
+        nodes['missing_type'].append(np.full(len(left), MISSING_NAN))
+        nodes['value'].append(np.where(is_leaf, cond, 0.0))
+        offset += len(left)
+    return _learner('xgboost', nodes, roots, aggregate='sum', base=base_score, strict=True, float32=True)
+
+
+def _learner(kind, nodes, roots, aggregate, base, strict, float32):
+    arrays = {
+        'feature': np.concatenate(nodes['feature']).astype(np.int32),
+        'threshold': np.concatenate(nodes['threshold']).astype(np.float64),
+        'left': np.concatenate(nodes['left']).astype(np.int32),
+        'right': np.concatenate(nodes['right']).astype(np.int32),
+        'default_left': np.concatenate(nodes['default_left']).astype(bool),
+        'missing_type': np.concatenate(nodes['missing_type']).astype(np.int8),
+        'value': np.concatenate(nodes['value']).astype(np.float64),
+        'roots': np.asarray(roots, dtype=np.int32),
+    }
+    meta = {'kind': kind, 'aggregate': aggregate, 'base': float(base), 'strict': strict, 'float32': float32}
+    return meta, arrays
+
+
+def _export_estimator(est):
+    name = type(est).__name__
+    if name in ('RandomForestRegressor', 'ExtraTreesRegressor', 'DecisionTreeRegressor', 'ExtraTreeRegressor'):
+        return _export_sklearn_forest(est)
+    if name == 'LGBMRegressor':
+        return _export_lightgbm(est)
+    if name == 'XGBRegressor':
+        return _export_xgboost(est)
+    raise ValueError(f"Unsupported base learner: {name}")
+
+
+def export_stacking_model(model):
+    """Flattens a fitted StackingRegressor (tree base learners + linear meta-learner) into arrays."""
+    final = model.final_estimator_
+    if not hasattr(final, 'coef_'):
+        raise ValueError(f"Unsupported meta-learner: {type(final).__name__}")
+
+    learners = [_export_estimator(est) for est in model.estimators_]
+    meta = {
+        'learners': [m for m, _ in learners],
+        'passthrough': bool(model.passthrough),
+        'feature_names': [str(c) for c in getattr(model, 'feature_names_in_', [])],
+    }
+    arrays = {'meta_coef': np.ravel(final.coef_).astype(np.float64),
+              'meta_intercept': np.atleast_1d(final.intercept_).astype(np.float64)}
+    for i, (_, learner_arrays) in enumerate(learners):
+        for field, values in learner_arrays.items():
+            arrays[f'learner{i}_{field}'] = values
+    return NativeEnsemble(meta, arrays)
+
+
+# ==========================================
+# ⚙️ NATIVE EVALUATOR
+# ==========================================
+
+class NativeEnsemble:
+    """Pure NumPy evaluator of an exported stacking ensemble."""
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.arrays = arrays
+        self.feature_names = meta['feature_names']
+        self.learners = [
+            (learner_meta, {f: arrays[f'learner{i}_{f}'] for f in NODE_FIELDS + ['roots']})
+            for i, learner_meta in enumerate(meta['learners'])
+        ]
+        self.coef = arrays['meta_coef']
+        self.intercept = float(arrays['meta_intercept'][0])
+
+    def save(self, path):
+        np.savez_compressed(path, meta=np.array(json.dumps(self.meta)), **self.arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {k: data[k] for k in data.files if k != 'meta'}
+            meta = json.loads(str(data['meta']))
+        return cls(meta, arrays)
+
+    @staticmethod
+    def _predict_learner(meta, a, X):
+        Xc = X.astype(np.float32).astype(np.float64) if meta['float32'] else X
+        n_rows, n_trees = Xc.shape[0], len(a['roots'])
+        rows = np.repeat(np.arange(n_rows), n_trees)
+        node = np.tile(a['roots'], n_rows)
+
+        # Walk every (row, tree) pair down one level per iteration until all reach a leaf
+        active = np.flatnonzero(a['feature'][node] >= 0)
+        while active.size:
+            current = node[active]
+            x = Xc[rows[active], a['feature'][current]]
+            thr = a['threshold'][current]
+            missing_type = a['missing_type'][current]
+
+            is_nan = np.isnan(x)
+            x = np.where(is_nan & (missing_type == MISSING_AS_ZERO), 0.0, x)
+            is_missing = (is_nan & (missing_type != MISSING_AS_ZERO)) | \
+                         ((missing_type == MISSING_ZERO) & (np.abs(x) <= ZERO_THRESHOLD))
+
+            go_left = (x < thr) if meta['strict'] else (x <= thr)
+            go_left = np.where(is_missing, a['default_left'][current], go_left)
+
+            node[active] = np.where(go_left, a['left'][current], a['right'][current])
+            active = active[a['feature'][node[active]] >= 0]
+
+        leaves = a['value'][node].reshape(n_rows, n_trees)
+        out = leaves.mean(axis=1) if meta['aggregate'] == 'mean' else leaves.sum(axis=1)
+        return out + meta['base']
+
+    def predict(self, X):
+        """X: 2D array (or DataFrame) with the columns in the training order."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        base_preds = np.column_stack([self._predict_learner(m, a, X) for m, a in self.learners])
+        if self.meta['passthrough']:
+            base_preds = np.hstack([base_preds, X])
+        return base_preds @ self.coef + self.intercept
+
+
+def verify(native, model, X, tolerance=1e-3):
+    """Compares the native evaluator with model.predict. Returns the max absolute error."""
+    expected = np.asarray(model.predict(X), dtype=float)
+    got = native.predict(X)
+    max_error = float(np.max(np.abs(expected - got))) if len(expected) else 0.0
+    if max_error > tolerance:
+        raise AssertionError(f"Native evaluator differs from model.predict by {max_error:.6f} (tolerance {tolerance})")
+    return max_error
+
+
+# ==========================================
+# 🚀 COMMAND LINE (export + verification)
+# ==========================================
+
+def _holdout(model_columns, csv_path=None, n_rows=2000):
+    import pandas as pd
+    if csv_path:
+        # Real holdout: raw listings through the training pipeline
+        from preprocessing import clean_airbnb_data, prepare_for_modeling
+        df = prepare_for_modeling(clean_airbnb_data(pd.read_csv(csv_path)))
+        df = df.reindex(columns=model_columns, fill_value=0)
+        return df.sample(min(n_rows, len(df)), random_state=42)
+
+    # Synthetic holdout: random perturbations around realistic values for every column
+    rng = np.random.default_rng(42)
+    X = pd.DataFrame(rng.normal(0, 1, (n_rows, len(model_columns))), columns=model_columns)
+    X['latitude'] = rng.uniform(40.33, 40.55, n_rows)
+    X['longitude'] = rng.uniform(-3.83, -3.55, n_rows)
+    for col in ['accommodates', 'bedrooms', 'beds', 'bathrooms', 'number_of_reviews']:
+        if col in X.columns:
+            X[col] = rng.integers(0, 8, n_rows)
+    return X
+
+
+def main():
+    import joblib
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Export the stacking ensemble into flat NumPy arrays")
+    parser.add_argument('--model', default=os.path.join(base_dir, 'models', 'airbnb_pricing_model.joblib'))
+    parser.add_argument('--columns', default=os.path.join(base_dir, 'models', 'model_columns.joblib'))
+    parser.add_argument('--output', default=os.path.join(base_dir, 'models', 'airbnb_pricing_model.npz'))
+    parser.add_argument('--verify', action='store_true', help="Check the export against model.predict")
+    parser.add_argument('--holdout-csv', default=None, help="Raw listings.csv used as holdout (synthetic rows otherwise)")
+    parser.add_argument('--tolerance', type=float, default=1e-3)
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    native = export_stacking_model(model)
+    native.save(args.output)
+    print(f"✅ Exported {len(native.learners)} base learners to {args.output} "
+          f"({round(os.path.getsize(args.output) / (1024 * 1024), 2)} MB)")
+
+    if args.verify:
+        X = _holdout(joblib.load(args.columns), args.holdout_csv)
+        max_error = verify(NativeEnsemble.load(args.output), model, X, args.tolerance)
+        print(f"✅ Verified on {len(X)} rows, max abs error: {max_error:.2e} €")
+
+
+if __name__ == '__main__':
+    main()
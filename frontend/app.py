@@ -7,7 +7,12 @@ import json
 import os
 import unicodedata
 import base64
+import io
 import pandas as pd
+from PIL import Image
+from geocoding import CacheGeocodificacion, buscar_en_nomenclator, construir_nomenclator
+from cliente_api import ClientePrediccion
+from capas_mapa import CapaBarrios, banda_para_zoom, cargar_capas
 
 # ==========================================
 # 0. CONFIGURACIÓN INICIAL Y ROUTER
@@ -33,20 +38,111 @@ if "barrio_manual" not in st.session_state:
     st.session_state.barrio_manual = "Sol"
 if "predicted_price" not in st.session_state:
     st.session_state.predicted_price = None
+if "latencia_prediccion" not in st.session_state:
+    st.session_state.latencia_prediccion = None
+if "zoom_host" not in st.session_state:
+    st.session_state.zoom_host = 14
 
 # Carga de recursos globales (API, Mapa, GeoJSON)
 import os
 API_URL = os.getenv("API_URL", "http://127.0.0.1:8000/predict")
-geolocator = Nominatim(user_agent="airbnb_pricer_madrid_app")
+# Los chollos se consultan al backend (filtrados, ordenados y paginados allí)
+OPPORTUNITIES_URL = os.getenv("OPPORTUNITIES_URL", API_URL.rsplit("/", 1)[0] + "/opportunities")
+OPPORTUNITIES_PAGE_SIZE = 200
+# Distrito/barrio de un punto con los polígonos de neighbourhoods.geojson (backend, sin Nominatim)
+NEIGHBOURHOODS_URL = os.getenv("NEIGHBOURHOODS_URL", API_URL.rsplit("/", 1)[0] + "/neighbourhoods/resolve")
+# Capa del mapa de chollos: GeoJSON agrupado por zoom en el backend
+OPPORTUNITIES_MAP_URL = OPPORTUNITIES_URL + "/map"
+
+# Estilo y popup de cada punto/grupo del mapa, en el navegador (nada de Python por marcador)
+ESTILO_CHOLLOS_JS = folium.JsCode("""
+function (feature, layer) {
+    var p = feature.properties;
+    var color = p.discount_pct > 40 ? "#00FF00" : "#FF9900";
+    layer.setStyle({color: color, fillColor: color});
+    if (p.count > 1) {
+        layer.setRadius(Math.min(6 + 3 * Math.log2(p.count), 24));
+        layer.bindTooltip(String(p.count), {permanent: true, direction: "center", className: "cluster-label"});
+        layer.bindPopup(
+            '<div style="font-family: Arial; min-width: 160px; padding: 5px;">' +
+            '<b>' + p.count + ' opportunities</b><br>' +
+            '<span style="color: green;"><b>Avg. Savings:</b> €' + p.residual.toFixed(2) + '</span><br>' +
+            '<b>Max Discount:</b> ' + p.discount_pct.toFixed(1) + ' %<br><i>Zoom in to see them</i></div>'
+        );
+        return;
+    }
+    layer.bindPopup(
+        '<div style="font-family: Arial; min-width: 160px; padding: 5px;">' +
+        '<b>Market Price:</b> €' + p.price + '<br>' +
+        '<b>AI Value:</b> €' + p.predicted_price.toFixed(2) + '<br>' +
+        '<span style="color: green;"><b>Savings:</b> €' + p.residual.toFixed(2) + '</span><br><br>' +
+        '<a href="' + (p.listing_url || '#') + '" target="_blank" style="background-color: #FF5A5F; color: white; padding: 8px 10px; text-decoration: none; border-radius: 5px; display: block; text-align: center; font-weight: bold;">🔗 View on Airbnb</a>' +
+        '</div>', {maxWidth: 300}
+    );
+}
+""")
+# Recursos compartidos por todas las sesiones: se construyen una vez por proceso, no en cada rerun
+@st.cache_resource(show_spinner=False)
+def geolocalizador():
+    return Nominatim(user_agent="airbnb_pricer_madrid_app")
+
+geolocator = geolocalizador()
+# Caché de geocodificación en disco (compartida por todas las sesiones) y su caducidad
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", ".cache", "geocoding.sqlite"))
+GEOCODE_CACHE_TTL_DAYS = float(os.getenv("GEOCODE_CACHE_TTL_DAYS", "30"))
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 geojson_path = os.path.join(current_dir, "..", "data", "neighbourhoods.geojson")
-geojson_data = None
-try:
-    with open(geojson_path, "r", encoding="utf-8") as f:
-        geojson_data = json.load(f)
-except FileNotFoundError:
-    pass
+
+@st.cache_resource(show_spinner=False)
+def cargar_geografia():
+    """
+    (geojson, nombres) de neighbourhoods.geojson, o None si no está.
+    nombres: id del polígono (su posición, como en las capas del mapa) -> (barrio, distrito) normalizados con limpiar_texto.
+    """
+    try:
+        with open(geojson_path, "r", encoding="utf-8") as f:
+            geojson = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    nombres = {}
+    for i, feature in enumerate(geojson.get('features', [])):
+        props = feature.get('properties') or {}
+        nombres[str(i)] = (limpiar_texto(props.get('neighbourhood', '')), limpiar_texto(props.get('neighbourhood_group', '')))
+    return geojson, nombres
+
+@st.cache_resource(show_spinner=False)
+def capas_barrios():
+    # Polígonos simplificados por banda de zoom y ya serializados (data/.cache/); {} si no hay GeoJSON
+    try:
+        return cargar_capas(geojson_path)
+    except FileNotFoundError:
+        return {}
+
+@st.cache_resource(show_spinner=False)
+def cache_geocodificacion():
+    return CacheGeocodificacion(GEOCODE_CACHE_PATH, ttl_segundos=GEOCODE_CACHE_TTL_DAYS * 24 * 3600)
+
+@st.cache_resource(show_spinner=False)
+def cliente_prediccion():
+    # Un solo cliente por servidor de Streamlit: pool de conexiones, caché y latencias compartidos
+    return ClientePrediccion(
+        API_URL,
+        connect_timeout=float(os.getenv("API_CONNECT_TIMEOUT", "3.05")),
+        read_timeout=float(os.getenv("API_READ_TIMEOUT", "10")),
+        reintentos=int(os.getenv("API_RETRIES", "2")),
+        tamano_cache=int(os.getenv("API_CLIENT_CACHE_SIZE", "256")),
+        # Versión del modelo activa: la caché no sirve precios de un modelo ya sustituido
+        url_version=os.getenv("MODEL_VERSION_URL", API_URL.rsplit("/", 1)[0] + "/health/ready"),
+        intervalo_version=float(os.getenv("API_VERSION_CHECK_INTERVAL", "5")),
+    )
+
+@st.cache_resource(show_spinner=False)
+def nomenclator_barrios():
+    # Centroides de los polígonos: cualquier distrito/barrio se sitúa sin Nominatim
+    geografia = cargar_geografia()
+    return construir_nomenclator(geografia[0] if geografia else None)
 
 madrid_geography = {
     "Centro": ["Sol", "Palacio", "Embajadores", "Cortes", "Justicia", "Universidad"],
@@ -75,11 +171,85 @@ def limpiar_texto(texto):
     if not texto: return ""
     return unicodedata.normalize('NFKD', str(texto)).encode('ASCII', 'ignore').decode('utf-8').lower().strip()
     
-def get_base64_image(file_path):
-    if os.path.exists(file_path):
-        with open(file_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode()
-    return ""
+def geocodificar(consulta):
+    """Nominatim pasando por la caché en disco. dict con latitude/longitude/address, o None si no existe."""
+    cache = cache_geocodificacion()
+    resultado = cache.get(consulta)
+    if resultado is None:
+        loc = geolocator.geocode(consulta, addressdetails=True, timeout=10)
+        if not loc:
+            return None
+        resultado = {"latitude": loc.latitude, "longitude": loc.longitude, "address": loc.raw.get('address', {})}
+        cache.put(consulta, resultado)
+    return resultado
+
+def geocodificar_inversa(lat, lon):
+    """Dirección de OSM del punto (caché en disco con las coordenadas a ~1 m), o None."""
+    consulta = f"reverse {lat:.5f},{lon:.5f}"
+    cache = cache_geocodificacion()
+    resultado = cache.get(consulta)
+    if resultado is None:
+        direccion = geolocator.reverse((lat, lon), timeout=10)
+        if not direccion:
+            return None
+        resultado = {"latitude": lat, "longitude": lon, "address": direccion.raw.get('address', {})}
+        cache.put(consulta, resultado)
+    return resultado
+
+def resolver_zona(lat, lon):
+    """(distrito, barrio) del punto según neighbourhoods.geojson, o None (fuera de Madrid / backend caído)."""
+    try:
+        response = requests.get(NEIGHBOURHOODS_URL, params={"lat": lat, "lon": lon}, timeout=2)
+    except requests.exceptions.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    zona = response.json()
+    return zona["district"], zona["neighbourhood"]
+
+def zona_desde_osm(addr):
+    """(distrito, barrio) a partir de las partes de una dirección de OSM (coincidencia aproximada)."""
+    zonas_osm = [
+        addr.get('city_district', ''), addr.get('district', ''),
+        addr.get('borough', ''), addr.get('suburb', ''),
+        addr.get('quarter', ''), addr.get('neighbourhood', ''),
+        addr.get('village', ''), addr.get('town', '')
+    ]
+    zonas_limpias = [limpiar_texto(z) for z in zonas_osm if z]
+
+    for d in madrid_geography.keys():
+        if any(limpiar_texto(d) in z or z in limpiar_texto(d) for z in zonas_limpias):
+            barrio = next((b for b in madrid_geography[d] if any(limpiar_texto(b) in z or z in limpiar_texto(b) for z in zonas_limpias)), None)
+            return d, barrio
+    return None, None
+
+def sincronizar_zona(distrito, barrio):
+    """Selecciona el distrito/barrio en los desplegables (sin tildes ni mayúsculas). False si el distrito no existe."""
+    distrito_match = next((d for d in madrid_geography if limpiar_texto(d) == limpiar_texto(distrito)), None)
+    if not distrito_match:
+        return False
+    barrio_match = next((b for b in madrid_geography[distrito_match] if limpiar_texto(b) == limpiar_texto(barrio)), None)
+    st.session_state.distrito_manual = distrito_match
+    st.session_state.barrio_manual = barrio_match or madrid_geography[distrito_match][0]
+    st.session_state.last_barrio = st.session_state.barrio_manual
+    return True
+
+@st.cache_resource(show_spinner=False)
+def get_base64_image(file_path, ancho_max=None):
+    """Imagen en base64, una vez por proceso. Con ancho_max se reescala y recomprime (JPEG) antes."""
+    if not os.path.exists(file_path):
+        return ""
+    if ancho_max:
+        try:
+            with Image.open(file_path) as imagen:
+                imagen.thumbnail((ancho_max, ancho_max))
+                buffer = io.BytesIO()
+                imagen.convert("RGB").save(buffer, "JPEG", quality=70, optimize=True, progressive=True)
+                return base64.b64encode(buffer.getvalue()).decode()
+        except OSError:
+            pass
+    with open(file_path, "rb") as img_file:
+        return base64.b64encode(img_file.read()).decode()
 
 # ==========================================
 # 1. PANTALLA DE INICIO (LANDING PAGE - ENGLISH)
@@ -89,7 +259,8 @@ def pantalla_landing():
     ruta_banner = os.path.join(current_dir, "assets", "madrid_tejados.jpg")
     ruta_logo = os.path.join(current_dir, "assets", "logo.jpg")
     
-    bg_base64 = get_base64_image(ruta_banner)
+    # Fondo reescalado: viaja en cada rerun de la portada, su tamaño no debe depender de la foto original
+    bg_base64 = get_base64_image(ruta_banner, ancho_max=1920)
     logo_base64 = get_base64_image(ruta_logo)
 
     # 2. Inyectamos el Súper CSS (Fondo oscuro y tarjetas)
@@ -198,27 +369,30 @@ def pantalla_host():
         
         if barrio_seleccionado != st.session_state.last_barrio:
             st.session_state.last_barrio = barrio_seleccionado
-            try:
-                loc = geolocator.geocode(f"{barrio_seleccionado}, {distrito_seleccionado}, Madrid, Spain")
-                if loc:
-                    st.session_state.lat = loc.latitude
-                    st.session_state.lon = loc.longitude
-                    st.session_state.direccion_texto = f"{barrio_seleccionado}, {distrito_seleccionado}"
-                    st.rerun() 
-            except:
-                pass 
+            # Centroide del barrio en el GeoJSON; Nominatim (con caché) solo si no aparece
+            punto = buscar_en_nomenclator(nomenclator_barrios(), distrito_seleccionado, barrio_seleccionado)
+            if punto is None:
+                try:
+                    loc = geocodificar(f"{barrio_seleccionado}, {distrito_seleccionado}, Madrid, Spain")
+                    punto = (loc["latitude"], loc["longitude"]) if loc else None
+                except Exception as e:
+                    print(f"🔥 Error de OSM: {e}")
+            if punto:
+                st.session_state.lat, st.session_state.lon = punto
+                st.session_state.direccion_texto = f"{barrio_seleccionado}, {distrito_seleccionado}"
+                st.rerun()
                 
         st.subheader("Exact Location")
         direccion_input = st.text_input("Type your street and number:", value=st.session_state.direccion_texto)
         
         if st.button("🔍 Search Address"):
             try:
-                loc = geolocator.geocode(f"{direccion_input}, Madrid, Spain", addressdetails=True)
+                loc = geocodificar(f"{direccion_input}, Madrid, Spain")
                 if loc:
-                    st.session_state.lat = loc.latitude
-                    st.session_state.lon = loc.longitude
+                    st.session_state.lat = loc["latitude"]
+                    st.session_state.lon = loc["longitude"]
                     
-                    addr = loc.raw.get('address', {})
+                    addr = loc["address"]
                     calle = addr.get('road', addr.get('pedestrian', addr.get('square', '')))
                     numero = addr.get('house_number', '').replace(',', '')
                     
@@ -227,35 +401,8 @@ def pantalla_host():
                     else:
                         st.session_state.direccion_texto = direccion_input
                     
-                    zonas_osm = [
-                        addr.get('city_district', ''), addr.get('district', ''),
-                        addr.get('borough', ''), addr.get('suburb', ''),
-                        addr.get('quarter', ''), addr.get('neighbourhood', ''),
-                        addr.get('village', ''), addr.get('town', '')
-                    ]
-                    zonas_limpias = [limpiar_texto(z) for z in zonas_osm if z]
-                    
-                    distrito_match = None
-                    for d in madrid_geography.keys():
-                        if any(limpiar_texto(d) in z or z in limpiar_texto(d) for z in zonas_limpias):
-                            distrito_match = d
-                            break
-                            
-                    if distrito_match:
-                        st.session_state.distrito_manual = distrito_match
-                        
-                        barrio_match = None
-                        for b in madrid_geography[distrito_match]:
-                            if any(limpiar_texto(b) in z or z in limpiar_texto(b) for z in zonas_limpias):
-                                barrio_match = b
-                                break
-                                
-                        if barrio_match:
-                            st.session_state.barrio_manual = barrio_match
-                            st.session_state.last_barrio = barrio_match
-                        else:
-                            st.session_state.barrio_manual = madrid_geography[distrito_match][0]
-                            st.session_state.last_barrio = st.session_state.barrio_manual
+                    # Polígonos locales primero; si no, las partes de la dirección de OSM
+                    sincronizar_zona(*(resolver_zona(loc["latitude"], loc["longitude"]) or zona_desde_osm(addr)))
 
                     st.success("✅ Ubicación encontrada y sincronizada!")
                     st.rerun()
@@ -290,38 +437,25 @@ def pantalla_host():
     with right_col:
         st.header("🗺️ Location Map")
         
-        m = folium.Map(location=[st.session_state.lat, st.session_state.lon], zoom_start=14, tiles="CartoDB positron")
+        m = folium.Map(location=[st.session_state.lat, st.session_state.lon], zoom_start=st.session_state.zoom_host, tiles="CartoDB positron")
         
-        if geojson_data:
+        geografia = cargar_geografia()
+        capa_zoom = capas_barrios().get(banda_para_zoom(st.session_state.zoom_host))
+        if geografia and capa_zoom:
+            _, nombres_barrios = geografia
             distrito_actual = limpiar_texto(st.session_state.distrito_manual)
             barrio_actual = limpiar_texto(st.session_state.barrio_manual)
-            barrios_del_distrito = [limpiar_texto(b) for b in madrid_geography.get(st.session_state.distrito_manual, [])]
-            
-            def style_function(feature):
-                props = feature.get('properties', {})
-                barrio_geojson = limpiar_texto(props.get('neighbourhood', ''))
-                distrito_geojson = limpiar_texto(props.get('neighbourhood_group', ''))
-                
+            barrios_del_distrito = {limpiar_texto(b) for b in madrid_geography.get(st.session_state.distrito_manual, [])}
+
+            # Los polígonos ya van serializados: de Python solo sale qué barrios se resaltan (2 = el elegido, 1 = su distrito)
+            seleccion = {}
+            for id_barrio, (barrio_geojson, distrito_geojson) in nombres_barrios.items():
                 if barrio_geojson == barrio_actual:
-                    return {"fillColor": "#FF5A5F", "color": "#FF5A5F", "weight": 3, "fillOpacity": 0.5}
+                    seleccion[id_barrio] = 2
                 elif distrito_geojson == distrito_actual or barrio_geojson in barrios_del_distrito:
-                    return {"fillColor": "#FF5A5F", "color": "#FF5A5F", "weight": 1.5, "fillOpacity": 0.15}
-                else:
-                    return {"fillColor": "#888888", "color": "#666666", "weight": 0.5, "fillOpacity": 0.3}
-
-            tiene_distrito = 'neighbourhood_group' in str(geojson_data)
-            hover_tooltip = folium.GeoJsonTooltip(
-                fields=['neighbourhood_group', 'neighbourhood'] if tiene_distrito else ['neighbourhood'],
-                aliases=['📍 District:', '🏘️ Neighborhood:'] if tiene_distrito else ['🏘️ Neighborhood:'],
-                style=("background-color: white; color: #333333; font-family: arial; font-size: 13px; padding: 10px; border-radius: 5px; box-shadow: 2px 2px 5px rgba(0,0,0,0.3);")
-            )
-
-            folium.GeoJson(
-                geojson_data,
-                name="Mapa de Madrid",
-                style_function=style_function,
-                tooltip=hover_tooltip
-            ).add_to(m)
+                    seleccion[id_barrio] = 1
+
+            CapaBarrios(capa_zoom, seleccion).add_to(m)
 
         folium.Marker(
             [st.session_state.lat, st.session_state.lon], 
@@ -330,6 +464,13 @@ def pantalla_host():
         ).add_to(m)
         
         map_data = st_folium(m, width=500, height=400)
+
+        # Al cruzar a otra banda de zoom se vuelve a pintar con la capa de ese nivel de detalle
+        if map_data and map_data.get("zoom") and map_data["zoom"] != st.session_state.zoom_host:
+            banda_anterior = banda_para_zoom(st.session_state.zoom_host)
+            st.session_state.zoom_host = map_data["zoom"]
+            if banda_para_zoom(map_data["zoom"]) != banda_anterior:
+                st.rerun()
         
         if map_data and map_data.get("last_clicked"):
             clic_lat = map_data["last_clicked"]["lat"]
@@ -338,58 +479,31 @@ def pantalla_host():
             if clic_lat != st.session_state.lat or clic_lon != st.session_state.lon:
                 st.session_state.lat = clic_lat
                 st.session_state.lon = clic_lon
-                should_rerun = False
-                
-                try:
-                    direccion = geolocator.reverse((clic_lat, clic_lon), timeout=10)
-                    if direccion:
-                        addr = direccion.raw.get('address', {})
-                        
-                        calle = addr.get('road', addr.get('pedestrian', addr.get('square', '')))
-                        numero = addr.get('house_number', '').replace(',', '')
-                        if calle:
-                            st.session_state.direccion_texto = f"{calle} {numero}".strip()
-                        else:
-                            st.session_state.direccion_texto = "Ubicación en el mapa"
-                        
-                        zonas_osm = [
-                            addr.get('city_district', ''), addr.get('district', ''),
-                            addr.get('borough', ''), addr.get('suburb', ''),
-                            addr.get('quarter', ''), addr.get('neighbourhood', ''),
-                            addr.get('village', ''), addr.get('town', '')
-                        ]
-                        zonas_limpias = [limpiar_texto(z) for z in zonas_osm if z]
-                        
-                        distrito_match = None
-                        for d in madrid_geography.keys():
-                            if any(limpiar_texto(d) in z or z in limpiar_texto(d) for z in zonas_limpias):
-                                distrito_match = d
-                                break
-                                
-                        if distrito_match:
-                            st.session_state.distrito_manual = distrito_match
-                            
-                            barrio_match = None
-                            for b in madrid_geography[distrito_match]:
-                                if any(limpiar_texto(b) in z or z in limpiar_texto(b) for z in zonas_limpias):
-                                    barrio_match = b
-                                    break
-                                    
-                            if barrio_match:
-                                st.session_state.barrio_manual = barrio_match
-                                st.session_state.last_barrio = barrio_match
+
+                # Distrito/barrio con los polígonos locales (microsegundos, sin llamar a Nominatim)
+                zona = resolver_zona(clic_lat, clic_lon)
+                if zona and sincronizar_zona(*zona):
+                    st.session_state.direccion_texto = f"{zona[1]}, {zona[0]}"
+                else:
+                    # Respaldo: geocodificación inversa con OSM (lenta y necesita red)
+                    try:
+                        direccion = geocodificar_inversa(clic_lat, clic_lon)
+                        if direccion:
+                            addr = direccion["address"]
+
+                            calle = addr.get('road', addr.get('pedestrian', addr.get('square', '')))
+                            numero = addr.get('house_number', '').replace(',', '')
+                            if calle:
+                                st.session_state.direccion_texto = f"{calle} {numero}".strip()
                             else:
-                                st.session_state.barrio_manual = madrid_geography[distrito_match][0]
-                                st.session_state.last_barrio = st.session_state.barrio_manual
-                                
-                    should_rerun = True
-                except Exception as e:
-                    print(f"🔥 Error de OSM: {e}")
-                    st.session_state.direccion_texto = "Ubicación seleccionada"
-                    should_rerun = True
-                    
-                if should_rerun:
-                    st.rerun()
+                                st.session_state.direccion_texto = "Ubicación en el mapa"
+
+                            sincronizar_zona(*zona_desde_osm(addr))
+                    except Exception as e:
+                        print(f"🔥 Error de OSM: {e}")
+                        st.session_state.direccion_texto = "Ubicación seleccionada"
+
+                st.rerun()
 
         st.divider()
         if st.button("🔮 Predict Optimal Price", type="primary", use_container_width=True):
@@ -413,18 +527,25 @@ def pantalla_host():
             
             with st.spinner("Calculating via Stacking Ensemble Model..."):
                 try:
-                    response = requests.post(API_URL, json=payload)
-                    if response.status_code == 200:
-                        result = response.json()
-                        st.session_state.predicted_price = result['predicted_price_euros']
-                        st.success("Analysis Complete!")
-                    else:
-                        st.error(f"Error from API: {response.text}")
+                    result, latencia = cliente_prediccion().predecir(payload)
+                    st.session_state.predicted_price = result['predicted_price_euros']
+                    st.session_state.latencia_prediccion = latencia
+                    st.success("Analysis Complete!")
+                except requests.exceptions.HTTPError as e:
+                    st.error(f"Error from API: {e.response.text}")
                 except requests.exceptions.ConnectionError:
                     st.error("🚨 Could not connect to the API. Is FastAPI running?")
+                except requests.exceptions.Timeout:
+                    st.error("⏱️ The API did not answer in time. Please try again.")
 
         if st.session_state.predicted_price is not None:
             st.metric(label="Suggested Nightly Price", value=f"€ {st.session_state.predicted_price:.2f}")
+            latencia = st.session_state.latencia_prediccion
+            if latencia:
+                if latencia["cache_local"]:
+                    st.caption(f"⏱️ {latencia['total_ms']:.1f} ms (answer reused)")
+                else:
+                    st.caption(f"⏱️ {latencia['total_ms']:.0f} ms total · model {latencia['backend_ms']:.0f} ms · network {latencia['red_ms']:.0f} ms")
 
 # ==========================================
 # 3. PANTALLA DEL INVERSOR (BUSCA CHOLLOS)
@@ -438,37 +559,28 @@ def pantalla_inversor():
     st.markdown("Find active listings currently priced below their AI-predicted market value. Maximize your ROI.")
     st.divider()
 
-    # 1. RUTA AL ARCHIVO DE CHOLLOS
-    ruta_chollos = os.path.join(current_dir, "..", "data", "chollos_madrid.csv")
-
-    # Si el archivo no existe, mostramos un aviso y paramos la ejecución de esta pantalla
-    if not os.path.exists(ruta_chollos):
-        st.warning("⚠️ Data file not found.")
-        st.info(f"Por favor, asegúrate de generar el archivo **chollos_madrid.csv** y guardarlo en la carpeta `data/`.")
+    # 1. CONSULTA AL BACKEND (solo viaja la página que se muestra)
+    @st.cache_data(ttl=60, show_spinner=False)
+    def consultar_chollos(min_savings=0, distritos=(), tipos=(), offset=0, limit=1):
+        params = {"min_savings": min_savings, "district": list(distritos), "room_type": list(tipos),
+                  "offset": offset, "limit": limit}
+        response = requests.get(OPPORTUNITIES_URL, params=params, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    def avisar_sin_chollos(e):
+        # Backend caído, sin chollos_madrid.csv o aún cargándolo (503)
+        st.warning("⚠️ Opportunity data not available.")
+        st.info(f"Por favor, asegúrate de generar el archivo **chollos_madrid.csv** (`python score_opportunities.py`) y de que el backend esté arrancado. Detalle: {e}")
+
+    # 2. FACETAS (distritos disponibles, ahorro máximo...) para construir los filtros
+    try:
+        facetas = consultar_chollos()["facets"]
+    except requests.exceptions.RequestException as e:
+        avisar_sin_chollos(e)
         return
 
-    # 2. CARGAMOS LOS DATOS (Con caché para que sea instantáneo)
-    @st.cache_data
-    def cargar_chollos():
-        df = pd.read_csv(ruta_chollos)
-        
-        # Aseguramos que existan las columnas clave (si no están, las calculamos si es posible)
-        if 'residual' not in df.columns and 'price' in df.columns and 'predicted_price' in df.columns:
-            df['residual'] = df['predicted_price'] - df['price']
-            
-        # Filtramos para quedarnos SOLO con los chollos (donde el modelo dice que vale MÁS de lo que cuesta)
-        df_chollos = df[df['residual'] > 0].copy()
-        
-        # Calculamos el % de descuento
-        if len(df_chollos) > 0:
-            df_chollos['discount_pct'] = (df_chollos['residual'] / df_chollos['predicted_price']) * 100
-            
-        # Ordenamos de mayor a menor chollo
-        return df_chollos.sort_values(by='residual', ascending=False)
-
-    df = cargar_chollos()
-
-    if df.empty:
+    if facetas["count"] == 0:
         st.warning("No se encontraron propiedades infravaloradas en el dataset actual.")
         return
 
@@ -477,71 +589,89 @@ def pantalla_inversor():
     c_filt1, c_filt2 = st.columns(2)
     
     with c_filt1:
-        max_residual = int(df['residual'].max()) if not df.empty else 100
-        min_discount = st.slider("Minimum Savings (€/night)", min_value=0, max_value=max_residual, value=20)
+        max_residual = int(facetas["max_residual"]) or 100
+        min_discount = st.slider("Minimum Savings (€/night)", min_value=0, max_value=max_residual, value=min(20, max_residual))
         
     with c_filt2:
-        # Detectamos cómo se llama tu columna de distritos (suele ser neighbourhood_group_cleansed o similar)
-        col_distrito = 'neighbourhood_group_cleansed' if 'neighbourhood_group_cleansed' in df.columns else ('neighbourhood_group' if 'neighbourhood_group' in df.columns else None)
-        
-        if col_distrito:
-            distritos_disponibles = sorted(df[col_distrito].dropna().unique())
-            distritos_seleccionados = st.multiselect("Filter by District", options=distritos_disponibles)
-        else:
-            distritos_seleccionados = []
-
-    # Aplicamos los filtros al DataFrame
-    df_filtrado = df[df['residual'] >= min_discount]
-    if distritos_seleccionados and col_distrito:
-        df_filtrado = df_filtrado[df_filtrado[col_distrito].isin(distritos_seleccionados)]
+        col_distrito = 'neighbourhood_group_cleansed'
+        distritos_seleccionados = st.multiselect("Filter by District", options=facetas["districts"])
+        tipos_seleccionados = st.multiselect("Filter by Room Type", options=facetas["room_types"])
+
+    # Página pedida al backend (el mapa y la tabla muestran la misma)
+    filtros = (min_discount, tuple(distritos_seleccionados), tuple(tipos_seleccionados))
+    try:
+        total_filtrado = consultar_chollos(*filtros)["total"]
+        n_paginas = max((total_filtrado - 1) // OPPORTUNITIES_PAGE_SIZE + 1, 1)
+        pagina = st.number_input("Page", min_value=1, max_value=n_paginas, value=1) if n_paginas > 1 else 1
+
+        resultado = consultar_chollos(*filtros, offset=(pagina - 1) * OPPORTUNITIES_PAGE_SIZE, limit=OPPORTUNITIES_PAGE_SIZE)
+    except requests.exceptions.RequestException as e:
+        avisar_sin_chollos(e)
+        return
+    df_filtrado = pd.DataFrame(resultado["items"])
+    resumen = resultado["summary"]
 
     # 4. MÉTRICAS CLAVE (KPIs)
     st.write("<br>", unsafe_allow_html=True)
     m1, m2, m3 = st.columns(3)
-    m1.metric("Opportunities Found", len(df_filtrado))
-    if len(df_filtrado) > 0:
-        m2.metric("Avg. Savings / Night", f"€ {df_filtrado['residual'].mean():.2f}")
-        m3.metric("Max Discount", f"{df_filtrado['discount_pct'].max():.1f} %")
+    m1.metric("Opportunities Found", resumen["count"])
+    if resumen["count"] > 0:
+        m2.metric("Avg. Savings / Night", f"€ {resumen['avg_residual']:.2f}")
+        m3.metric("Max Discount", f"{resumen['max_discount_pct']:.1f} %")
 
-    # 5. MAPA DE CALOR INTERACTIVO
+    # 5. MAPA DE CALOR INTERACTIVO (todos los chollos filtrados, agrupados según el zoom)
     st.write("<br>", unsafe_allow_html=True)
     st.subheader("📍 Heatmap of Bargains")
-    
-    # Usamos un mapa oscuro para el inversor, da un toque más analítico
-    m_inv = folium.Map(location=[40.4168, -3.7038], zoom_start=12, tiles="CartoDB dark_matter")
 
-    for _, row in df_filtrado.head(200).iterrows():
-        color_punto = "#00FF00" if row.get('discount_pct', 0) > 40 else "#FF9900"
-        
-        # 🚨 NUEVO: Añadimos el botón clickeable hacia Airbnb
-        url_airbnb = row.get('listing_url', '#')
-        html_popup = f"""
-        <div style="font-family: Arial; min-width: 160px; padding: 5px;">
-            <b>Market Price:</b> €{row.get('price', 0)}<br>
-            <b>AI Value:</b> €{row.get('predicted_price', 0):.2f}<br>
-            <span style="color: green;"><b>Savings:</b> €{row.get('residual', 0):.2f}</span><br><br>
-            <a href="{url_airbnb}" target="_blank" style="background-color: #FF5A5F; color: white; padding: 8px 10px; text-decoration: none; border-radius: 5px; display: block; text-align: center; font-weight: bold;">🔗 View on Airbnb</a>
-        </div>
-        """
-        
-        folium.CircleMarker(
-            location=[row['latitude'], row['longitude']],
-            radius=6,
-            color=color_punto,
-            fill=True,
-            fill_opacity=0.8,
-            popup=folium.Popup(html_popup, max_width=300)
-        ).add_to(m_inv)
+    @st.cache_data(ttl=60, show_spinner=False)
+    def capa_chollos(min_savings, distritos, tipos, zoom):
+        params = {"min_savings": min_savings, "district": list(distritos), "room_type": list(tipos), "zoom": zoom}
+        response = requests.get(OPPORTUNITIES_MAP_URL, params=params, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    if "zoom_inversor" not in st.session_state:
+        st.session_state.zoom_inversor = 12
+    try:
+        capa_geojson = capa_chollos(*filtros, st.session_state.zoom_inversor)
+    except requests.exceptions.RequestException as e:
+        st.error(f"❌ Could not load the map layer: {e}")
+        capa_geojson = {"type": "FeatureCollection", "features": []}
 
-    st_folium(m_inv, width="100%", height=500, key="inversor_map")
+    # Usamos un mapa oscuro para el inversor, da un toque más analítico
+    m_inv = folium.Map(location=[40.4168, -3.7038], zoom_start=12, tiles="CartoDB dark_matter")
+    m_inv.get_root().header.add_child(folium.Element(
+        "<style>.cluster-label {background: none; border: none; box-shadow: none; color: #111; font-weight: bold;}</style>"
+    ))
+
+    # Una sola capa GeoJSON; st_folium la cambia sin volver a montar el mapa
+    capa = folium.FeatureGroup(name="Bargains")
+    folium.GeoJson(
+        capa_geojson,
+        marker=folium.CircleMarker(radius=6, fill=True, fill_opacity=0.8, weight=1),
+        on_each_feature=ESTILO_CHOLLOS_JS,
+    ).add_to(capa)
+
+    estado_mapa = st_folium(m_inv, width="100%", height=500, key="inversor_map",
+                            feature_group_to_add=capa, returned_objects=["zoom"])
+    st.caption(f"Showing all {total_filtrado} opportunities. Zoom in to split the groups.")
+
+    # Nuevo zoom -> se pide la capa agrupada para ese zoom
+    nuevo_zoom = (estado_mapa or {}).get("zoom")
+    if nuevo_zoom and nuevo_zoom != st.session_state.zoom_inversor:
+        st.session_state.zoom_inversor = nuevo_zoom
+        st.rerun()
 
     # 6. TABLA DE DATOS CRUDOS
     st.subheader("📋 Detailed Listings")
+    if df_filtrado.empty:
+        st.info("No listings match the selected filters.")
+        return
     
     # 🚨 NUEVO: Añadimos el link a las columnas que se muestran
     cols_to_show = [c for c in ['listing_url', 'latitude', 'longitude', 'price', 'predicted_price', 'residual', 'discount_pct'] if c in df_filtrado.columns]
     
-    if col_distrito:
+    if col_distrito in df_filtrado.columns:
         cols_to_show.insert(1, col_distrito) # Lo ponemos después del link
         
     # 🚨 NUEVO: Usamos column_config para decirle a Streamlit que renderice la URL como un enlace clickeable
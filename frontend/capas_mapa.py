@@ -0,0 +1,326 @@
+"""
+Capa de barrios del mapa del host, precalculada una vez por banda de zoom:
+
+- Polígonos simplificados (Douglas-Peucker) sin romper la topología: los anillos se cortan
+  en los vértices donde cambian los barrios vecinos y cada borde compartido se simplifica
+  una sola vez, igual para los dos lados (sin huecos ni solapes entre barrios).
+- Coordenadas cuantizadas a los decimales que pide la banda y solo las propiedades del tooltip.
+- GeoJSON ya serializado (y guardado en data/.cache/ mientras el GeoJSON original no cambie):
+  CapaBarrios lo mete tal cual en la página y desde Python solo cambia qué barrios se resaltan.
+
+Informe de tamaño y tiempo de render (capa completa vs simplificada):
+    python capas_mapa.py --informe
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import os
+import time
+
+import folium
+from folium.elements import MacroElement, Template
+
+# Bandas de zoom: (nombre, zoom máximo al que la capa se ve sin perder detalle)
+BANDAS_ZOOM = [("z12", 12), ("z14", 14), ("z16", 16)]
+TOLERANCIA_PX = 0.5  # error máximo de la simplificación, en píxeles de pantalla
+METROS_POR_PIXEL_Z0 = 156543.03392  # tiles de 256 px, en el ecuador
+METROS_POR_GRADO = 111320.0
+PROPIEDADES_CAPA = ("neighbourhood_group", "neighbourhood")
+
+# Súbela si cambia la forma de construir las capas: las antiguas de la caché no se reutilizan
+VERSION_CAPAS = 1
+
+
+def banda_para_zoom(zoom):
+    """Nombre de la banda que se usa a ese zoom (la última para zooms mayores)."""
+    for nombre, zoom_max in BANDAS_ZOOM:
+        if zoom is not None and zoom <= zoom_max:
+            return nombre
+    return BANDAS_ZOOM[-1][0]
+
+
+def tolerancia_grados(zoom, lat):
+    """TOLERANCIA_PX a ese zoom y latitud, en grados de latitud."""
+    return TOLERANCIA_PX * METROS_POR_PIXEL_Z0 * math.cos(math.radians(lat)) / 2 ** zoom / METROS_POR_GRADO
+
+
+def decimales_para(tolerancia):
+    # Cuantizar no debe mover un vértice más de media tolerancia
+    return max(0, math.ceil(-math.log10(tolerancia / 2)))
+
+
+def _poligonos(geometria):
+    if geometria.get('type') == 'Polygon':
+        return [geometria['coordinates']]
+    if geometria.get('type') == 'MultiPolygon':
+        return geometria['coordinates']
+    return None
+
+
+def _douglas_peucker(puntos, tolerancia, escala_x):
+    """Puntos que quedan de la polilínea (los extremos siempre). x se escala por cos(lat) para medir en grados de latitud."""
+    if len(puntos) <= 2:
+        return list(puntos)
+    conservar = [False] * len(puntos)
+    conservar[0] = conservar[-1] = True
+    pendientes = [(0, len(puntos) - 1)]
+    while pendientes:
+        i, j = pendientes.pop()
+        x0, y0 = puntos[i][0] * escala_x, puntos[i][1]
+        dx, dy = puntos[j][0] * escala_x - x0, puntos[j][1] - y0
+        norma = math.hypot(dx, dy)
+        maxima, k_max = -1.0, None
+        for k in range(i + 1, j):
+            x, y = puntos[k][0] * escala_x - x0, puntos[k][1] - y0
+            # Distancia al segmento i-j (al punto i si el tramo es cerrado)
+            distancia = abs(dy * x - dx * y) / norma if norma else math.hypot(x, y)
+            if distancia > maxima:
+                maxima, k_max = distancia, k
+        if k_max is not None and maxima > tolerancia:
+            conservar[k_max] = True
+            pendientes.append((i, k_max))
+            pendientes.append((k_max, j))
+    return [p for p, c in zip(puntos, conservar) if c]
+
+
+def simplificar_geojson(geojson, tolerancia, decimales):
+    """FeatureCollection simplificada y cuantizada. id de cada feature = su posición en el original."""
+    features = (geojson or {}).get('features', [])
+    coordenadas = [p for f in features for poligono in (_poligonos(f.get('geometry') or {}) or []) for anillo in poligono for p in anillo]
+    lat_media = sum(p[1] for p in coordenadas) / len(coordenadas) if coordenadas else 0.0
+    escala_x = math.cos(math.radians(lat_media))
+
+    # 1. Anillos cuantizados, sin el punto de cierre ni vértices repetidos seguidos
+    anillos = []
+    for feature in features:
+        for poligono in _poligonos(feature.get('geometry') or {}) or []:
+            for anillo in poligono:
+                puntos = []
+                for p in anillo:
+                    punto = (round(p[0], decimales), round(p[1], decimales))
+                    if not puntos or punto != puntos[-1]:
+                        puntos.append(punto)
+                while len(puntos) > 1 and puntos[0] == puntos[-1]:
+                    puntos.pop()
+                anillos.append(puntos)
+
+    # 2. Anillos a los que pertenece cada vértice
+    duenos = {}
+    for r, puntos in enumerate(anillos):
+        for punto in puntos:
+            duenos.setdefault(punto, set()).add(r)
+
+    # 3. Cada anillo se corta donde cambian sus vecinos; cada tramo se simplifica una vez (en orden canónico)
+    tramos = {}
+
+    def simplificar_tramo(tramo):
+        canonico = min(tramo, tramo[::-1])
+        if canonico not in tramos:
+            tramos[canonico] = _douglas_peucker(canonico, tolerancia, escala_x)
+        return tramos[canonico] if canonico == tramo else tramos[canonico][::-1]
+
+    simplificados = []
+    for puntos in anillos:
+        n = len(puntos)
+        cortes = [k for k in range(n) if duenos[puntos[k]] != duenos[puntos[k - 1]] or duenos[puntos[k]] != duenos[puntos[(k + 1) % n]]]
+        if not cortes:
+            anillo = _douglas_peucker(puntos + puntos[:1], tolerancia, escala_x)
+        else:
+            girado = puntos[cortes[0]:] + puntos[:cortes[0]] + puntos[cortes[0]:cortes[0] + 1]
+            posiciones = [k - cortes[0] for k in cortes] + [n]
+            anillo = [girado[0]]
+            for a, b in zip(posiciones, posiciones[1:]):
+                anillo.extend(simplificar_tramo(tuple(girado[a:b + 1]))[1:])
+        # Un anillo que se queda en menos de 3 vértices: fuera si es un hueco, sin simplificar si es el exterior
+        simplificados.append(anillo if len(anillo) >= 4 else None)
+
+    # 4. Mismas features, con la geometría nueva y solo las propiedades del tooltip
+    salida, r = [], 0
+    for i, feature in enumerate(features):
+        geometria = feature.get('geometry') or {}
+        props = feature.get('properties') or {}
+        nueva = {
+            "type": "Feature",
+            "id": str(i),
+            "properties": {k: props[k] for k in PROPIEDADES_CAPA if k in props},
+            "geometry": geometria,
+        }
+        poligonos = _poligonos(geometria)
+        if poligonos is not None:
+            nuevos = []
+            for poligono in poligonos:
+                anillos_poligono = []
+                for j in range(len(poligono)):
+                    anillo = simplificados[r]
+                    if anillo is None and j == 0:
+                        anillo = anillos[r] + anillos[r][:1]
+                    if anillo is not None and len(anillo) >= 4:
+                        anillos_poligono.append([list(p) for p in anillo])
+                    r += 1
+                if anillos_poligono:
+                    nuevos.append(anillos_poligono)
+            if geometria['type'] == 'Polygon':
+                nueva["geometry"] = {"type": "Polygon", "coordinates": nuevos[0] if nuevos else []}
+            else:
+                nueva["geometry"] = {"type": "MultiPolygon", "coordinates": nuevos}
+        salida.append(nueva)
+    return {"type": "FeatureCollection", "features": salida}
+
+
+def serializar(geojson):
+    return json.dumps(geojson, ensure_ascii=False, separators=(",", ":"))
+
+
+def construir_capas(geojson):
+    """{banda: GeoJSON serializado} de todas las bandas de zoom."""
+    lats = [p[1] for f in geojson.get('features', []) for poligono in (_poligonos(f.get('geometry') or {}) or []) for anillo in poligono for p in anillo]
+    lat_media = sum(lats) / len(lats) if lats else 0.0
+    capas = {}
+    for nombre, zoom_max in BANDAS_ZOOM:
+        tolerancia = tolerancia_grados(zoom_max, lat_media)
+        capas[nombre] = serializar(simplificar_geojson(geojson, tolerancia, decimales_para(tolerancia)))
+    return capas
+
+
+def cargar_capas(geojson_path, cache_dir=None):
+    """
+    {banda: GeoJSON serializado} de neighbourhoods.geojson. Se leen de la caché si el
+    GeoJSON (SHA-1) no ha cambiado; si no, se construyen y se guardan (si se puede escribir).
+    """
+    with open(geojson_path, 'rb') as f:
+        contenido = f.read()
+    huella = hashlib.sha1(contenido).hexdigest()[:16]
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(geojson_path)), '.cache')
+    stem = os.path.splitext(os.path.basename(geojson_path))[0]
+    rutas = {nombre: os.path.join(cache_dir, f"{stem}.{nombre}.v{VERSION_CAPAS}.{huella}.json") for nombre, _ in BANDAS_ZOOM}
+
+    if all(os.path.exists(ruta) for ruta in rutas.values()):
+        capas = {}
+        for nombre, ruta in rutas.items():
+            with open(ruta, 'r', encoding='utf-8') as f:
+                capas[nombre] = f.read()
+        return capas
+
+    inicio = time.time()
+    capas = construir_capas(json.loads(contenido))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for nombre, ruta in rutas.items():
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            with open(temporal, 'w', encoding='utf-8') as f:
+                f.write(capas[nombre])
+            os.replace(temporal, ruta)
+        print(f"✅ Capas del mapa de barrios construidas en {time.time() - inicio:.2f}s ({cache_dir})")
+    except OSError as e:
+        print(f"⚠️ Capas del mapa de barrios solo en memoria ({cache_dir}): {e}")
+    return capas
+
+
+class CapaBarrios(MacroElement):
+    """
+    Capa de barrios a partir del GeoJSON ya serializado: no se vuelve a convertir a JSON en
+    cada rerun. seleccion: {id: 2 (barrio elegido) | 1 (su distrito)}; el resto va en gris.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }}_seleccion = {{ this.seleccion|tojson }};
+        var {{ this.get_name() }}_estilos = {{ this.estilos|tojson }};
+        var {{ this.get_name() }} = L.geoJson({{ this.datos }}, {
+            style: function (feature) {
+                return {{ this.get_name() }}_estilos[{{ this.get_name() }}_seleccion[feature.id] || 0];
+            },
+            onEachFeature: function (feature, layer) {
+                var p = feature.properties;
+                layer.bindTooltip(
+                    '<div style="{{ this.estilo_tooltip }}">' +
+                    (p.neighbourhood_group !== undefined ? '<b>📍 District:</b> ' + p.neighbourhood_group + '<br>' : '') +
+                    '<b>🏘️ Neighborhood:</b> ' + p.neighbourhood + '</div>', {sticky: true}
+                );
+            }
+        }).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    ESTILOS = [
+        {"fillColor": "#888888", "color": "#666666", "weight": 0.5, "fillOpacity": 0.3},
+        {"fillColor": "#FF5A5F", "color": "#FF5A5F", "weight": 1.5, "fillOpacity": 0.15},
+        {"fillColor": "#FF5A5F", "color": "#FF5A5F", "weight": 3, "fillOpacity": 0.5},
+    ]
+    ESTILO_TOOLTIP = "background-color: white; color: #333333; font-family: arial; font-size: 13px; padding: 10px; border-radius: 5px; box-shadow: 2px 2px 5px rgba(0,0,0,0.3);"
+
+    def __init__(self, datos, seleccion=None):
+        super().__init__()
+        self._name = "CapaBarrios"
+        self.datos = datos
+        self.seleccion = seleccion or {}
+        self.estilos = self.ESTILOS
+        self.estilo_tooltip = self.ESTILO_TOOLTIP
+
+
+# ==========================================
+# 📊 INFORME: TAMAÑO Y RENDER, ANTES Y DESPUÉS
+# ==========================================
+def _vertices(geojson):
+    return sum(len(anillo) for f in geojson.get('features', []) for poligono in (_poligonos(f.get('geometry') or {}) or []) for anillo in poligono)
+
+
+def _tiempo_render(añadir_capa, repeticiones):
+    tiempos, tamano = [], 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        m = folium.Map(location=[40.4168, -3.7038], zoom_start=14, tiles="CartoDB positron")
+        añadir_capa(m)
+        html = m.get_root().render()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        tamano = len(html.encode('utf-8'))
+    return sorted(tiempos)[len(tiempos) // 2], tamano
+
+
+def informe(geojson_path, repeticiones=5):
+    with open(geojson_path, 'r', encoding='utf-8') as f:
+        geojson = json.load(f)
+    inicio = time.perf_counter()
+    capas = construir_capas(geojson)
+    construccion = time.perf_counter() - inicio
+
+    def kb(texto):
+        datos = texto.encode('utf-8')
+        return f"{len(datos) / 1024:8.1f} KB ({len(gzip.compress(datos)) / 1024:6.1f} KB gzip)"
+
+    # Antes: folium.GeoJson con style_function y GeoJsonTooltip, como pantalla_host hasta ahora
+    def capa_folium(m):
+        folium.GeoJson(
+            geojson,
+            style_function=lambda feature: CapaBarrios.ESTILOS[0],
+            tooltip=folium.GeoJsonTooltip(fields=[k for k in PROPIEDADES_CAPA if k in (geojson['features'][0].get('properties') or {})]),
+        ).add_to(m)
+
+    print(f"📊 {geojson_path}: {len(geojson.get('features', []))} barrios, capas construidas en {construccion:.2f}s")
+    print(f"   {'original':<9} {_vertices(geojson):7d} vértices | {kb(json.dumps(geojson))}")
+    for nombre, _ in BANDAS_ZOOM:
+        print(f"   {nombre:<9} {_vertices(json.loads(capas[nombre])):7d} vértices | {kb(capas[nombre])}")
+
+    mediana, tamano = _tiempo_render(capa_folium, repeticiones)
+    print(f"   render folium.GeoJson (antes):   {mediana:7.1f} ms | página {tamano / 1024:8.1f} KB")
+    for nombre, _ in BANDAS_ZOOM:
+        mediana, tamano = _tiempo_render(lambda m: CapaBarrios(capas[nombre], {"0": 2}).add_to(m), repeticiones)
+        print(f"   render CapaBarrios {nombre} (ahora): {mediana:7.1f} ms | página {tamano / 1024:8.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capas simplificadas del mapa de barrios: tamaño y tiempo de render")
+    parser.add_argument("--informe", action="store_true", help="Construye las capas e imprime tamaños y tiempos")
+    parser.add_argument("--geojson", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "neighbourhoods.geojson"))
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+    if args.informe:
+        informe(args.geojson, args.repeticiones)
+    else:
+        capas = cargar_capas(args.geojson)
+        print(f"✅ {len(capas)} capas listas: {', '.join(capas)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Cliente de POST /predict compartido por todas las sesiones de Streamlit:
+conexiones keep-alive reutilizadas, timeouts de conexión/lectura, reintentos con espera
+creciente, caché en memoria por (versión del modelo, payload) y registro de latencias (red vs backend).
+
+La versión activa del backend sale de cada respuesta de /predict y se vuelve a mirar en
+/health/ready cada intervalo_version segundos: tras un cambio de modelo en caliente, como
+mucho durante ese intervalo se sirven precios de la versión anterior.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return round(ordenados[min(int(len(ordenados) * p / 100), len(ordenados) - 1)], 1)
+
+
+class ClientePrediccion:
+    def __init__(self, url, connect_timeout=3.05, read_timeout=10.0, reintentos=2, espera_reintento=0.3,
+                 tamano_pool=10, tamano_cache=256, ttl_cache=600.0, historial=200,
+                 url_version=None, intervalo_version=5.0):
+        self.url = url
+        self.url_version = url_version
+        self.intervalo_version = intervalo_version
+        self.timeout = (connect_timeout, read_timeout)
+        self.ttl_cache = ttl_cache
+        self.tamano_cache = tamano_cache
+
+        # 1. Sesión con pool de conexiones y reintentos (una predicción es idempotente: POST incluido).
+        # Un backend colgado no se reintenta (read=False): el timeout de lectura llega tal cual
+        reintento = Retry(
+            total=reintentos,
+            read=False,
+            backoff_factor=espera_reintento,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=tamano_pool, pool_maxsize=tamano_pool, max_retries=reintento)
+        self.session.mount("http://", adaptador)
+        self.session.mount("https://", adaptador)
+
+        # 2. Caché LRU (payload -> respuesta) y últimas latencias
+        self._cache = OrderedDict()
+        self._latencias = deque(maxlen=historial)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+        # 3. Última versión del modelo vista en el backend (None = aún no se sabe)
+        self.version_modelo = None
+        self._version_comprobada = float("-inf")
+
+    @staticmethod
+    def clave(payload, version_modelo=None):
+        return f"{version_modelo}|{json.dumps(payload, sort_keys=True, separators=(',', ':'))}"
+
+    def _version(self):
+        """Versión activa del modelo; se pregunta a /health/ready si hace más de intervalo_version s."""
+        if self.url_version and time.monotonic() - self._version_comprobada > self.intervalo_version:
+            self._version_comprobada = time.monotonic()
+            try:
+                response = self.session.get(self.url_version, timeout=self.timeout)
+                if response.ok:
+                    self.version_modelo = response.json().get("model_version") or self.version_modelo
+            except (requests.RequestException, ValueError):
+                pass  # Sin respuesta: se sigue con la última versión conocida
+        return self.version_modelo
+
+    def _de_cache(self, clave):
+        with self._lock:
+            entrada = self._cache.get(clave)
+            if entrada is None or time.monotonic() - entrada[1] > self.ttl_cache:
+                self._cache.pop(clave, None)
+                self.fallos += 1
+                return None
+            self._cache.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[0]
+
+    def _a_cache(self, clave, resultado):
+        with self._lock:
+            self._cache[clave] = (resultado, time.monotonic())
+            self._cache.move_to_end(clave)
+            while len(self._cache) > self.tamano_cache:
+                self._cache.popitem(last=False)
+
+    def predecir(self, payload):
+        """
+        (respuesta JSON, latencia) de POST /predict. Lanza requests.HTTPError si el backend responde
+        con error, y requests.ConnectionError / requests.Timeout si no responde.
+        latencia: {'total_ms', 'backend_ms', 'red_ms', 'cache_local'}.
+        """
+        inicio = time.perf_counter()
+        version = self._version() if self.tamano_cache > 0 else None
+        resultado = self._de_cache(self.clave(payload, version)) if self.tamano_cache > 0 else None
+        if resultado is not None:
+            latencia = {"total_ms": round((time.perf_counter() - inicio) * 1000, 2), "backend_ms": 0.0, "red_ms": 0.0, "cache_local": True}
+        else:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            total_ms = (time.perf_counter() - inicio) * 1000
+            response.raise_for_status()
+            resultado = response.json()
+            # La respuesta dice con qué versión se calculó: se guarda con esa
+            self.version_modelo = resultado.get("model_version") or self.version_modelo
+            if self.tamano_cache > 0:
+                self._a_cache(self.clave(payload, resultado.get("model_version") or version), resultado)
+
+            # Tiempo dentro del modelo según el backend; el resto es red + HTTP + (des)serialización
+            tiempos = resultado.get("timings_ms") or {}
+            backend_ms = float(tiempos.get("queue_ms", 0.0)) + float(tiempos.get("compute_ms", 0.0))
+            latencia = {"total_ms": round(total_ms, 2), "backend_ms": round(backend_ms, 2),
+                        "red_ms": round(max(total_ms - backend_ms, 0.0), 2), "cache_local": False}
+
+        with self._lock:
+            self._latencias.append(latencia)
+        return resultado, latencia
+
+    def estadisticas(self):
+        """Percentiles de las últimas llamadas que fueron al backend, y aciertos de la caché."""
+        with self._lock:
+            remotas = [l for l in self._latencias if not l["cache_local"]]
+            return {
+                "llamadas": len(remotas),
+                "total_p50_ms": _percentil([l["total_ms"] for l in remotas], 50),
+                "total_p95_ms": _percentil([l["total_ms"] for l in remotas], 95),
+                "red_p50_ms": _percentil([l["red_ms"] for l in remotas], 50),
+                "backend_p50_ms": _percentil([l["backend_ms"] for l in remotas], 50),
+                "version_modelo": self.version_modelo,
+                "cache_aciertos": self.aciertos,
+                "cache_fallos": self.fallos,
+            }
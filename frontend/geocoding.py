@@ -0,0 +1,146 @@
+"""
+Geocodificación sin repetir llamadas a Nominatim:
+
+- CacheGeocodificacion: caché en disco (SQLite) consulta normalizada -> coordenadas/dirección,
+  con caducidad. Sobrevive a los reinicios y la comparten todas las sesiones de Streamlit.
+- construir_nomenclator: centroides de los polígonos de neighbourhoods.geojson, para
+  situar cualquier distrito/barrio sin salir a la red.
+"""
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+
+
+def normalizar_consulta(texto):
+    """Sin tildes, minúsculas y espacios/comas normalizados: 'Calle  Mayor,1' == 'calle mayor, 1'."""
+    texto = unicodedata.normalize('NFKD', str(texto or "")).encode('ASCII', 'ignore').decode('utf-8').lower()
+    texto = re.sub(r"\s*,\s*", ", ", texto)
+    return re.sub(r"\s+", " ", texto).strip(" ,")
+
+
+class CacheGeocodificacion:
+    """Caché persistente de geocodificación (una tabla SQLite). Si el fichero no se puede usar, no cachea."""
+
+    def __init__(self, ruta, ttl_segundos=30 * 24 * 3600):
+        self.ruta = ruta
+        self.ttl_segundos = ttl_segundos
+        self.activa = True
+        self.aciertos = 0
+        self.fallos = 0
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+            with self._conexion() as con:
+                con.execute(
+                    "CREATE TABLE IF NOT EXISTS geocoding ("
+                    "consulta TEXT PRIMARY KEY, resultado TEXT NOT NULL, guardado REAL NOT NULL)"
+                )
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️ Caché de geocodificación desactivada ({ruta}): {e}")
+            self.activa = False
+
+    def _conexion(self):
+        # Una conexión por operación: vale para varios hilos (sesiones) y procesos a la vez
+        return sqlite3.connect(self.ruta, timeout=5)
+
+    def get(self, consulta):
+        """Resultado guardado (dict) de la consulta, o None si no está o ha caducado."""
+        if not self.activa:
+            return None
+        try:
+            with self._conexion() as con:
+                fila = con.execute(
+                    "SELECT resultado, guardado FROM geocoding WHERE consulta = ?", (normalizar_consulta(consulta),)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        if fila is None or time.time() - fila[1] > self.ttl_segundos:
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        return json.loads(fila[0])
+
+    def put(self, consulta, resultado):
+        if not self.activa:
+            return
+        try:
+            with self._conexion() as con:
+                con.execute(
+                    "INSERT OR REPLACE INTO geocoding (consulta, resultado, guardado) VALUES (?, ?, ?)",
+                    (normalizar_consulta(consulta), json.dumps(resultado, ensure_ascii=False), time.time()),
+                )
+                # Las entradas caducadas se limpian al escribir
+                con.execute("DELETE FROM geocoding WHERE guardado < ?", (time.time() - self.ttl_segundos,))
+        except sqlite3.Error as e:
+            print(f"⚠️ No se pudo guardar en la caché de geocodificación: {e}")
+
+
+def _anillo(anillo):
+    """(área con signo, centroide x, centroide y) de un anillo (fórmula del área de Gauss)."""
+    area = cx = cy = 0.0
+    for (x0, y0), (x1, y1) in zip(anillo, anillo[1:] + anillo[:1]):
+        cruz = x0 * y1 - x1 * y0
+        area += cruz
+        cx += (x0 + x1) * cruz
+        cy += (y0 + y1) * cruz
+    area /= 2
+    if area == 0:
+        return 0.0, 0.0, 0.0
+    return area, cx / (6 * area), cy / (6 * area)
+
+
+def area_y_centroide(geometria):
+    """(área, lon, lat) de un Polygon/MultiPolygon de GeoJSON, restando los huecos. Área en grados²."""
+    if geometria.get('type') == 'Polygon':
+        poligonos = [geometria['coordinates']]
+    elif geometria.get('type') == 'MultiPolygon':
+        poligonos = geometria['coordinates']
+    else:
+        return 0.0, 0.0, 0.0
+
+    area_total = sx = sy = 0.0
+    for poligono in poligonos:
+        for i, anillo in enumerate(poligono):
+            area, cx, cy = _anillo([tuple(p[:2]) for p in anillo])
+            # El exterior suma y los huecos restan, sea cual sea su orientación
+            area = abs(area) if i == 0 else -abs(area)
+            area_total += area
+            sx += area * cx
+            sy += area * cy
+    if area_total <= 0:
+        return 0.0, 0.0, 0.0
+    return area_total, sx / area_total, sy / area_total
+
+
+def construir_nomenclator(geojson):
+    """
+    {'barrios': {(distrito, barrio): (lat, lon)}, 'solo_barrio': {barrio: (lat, lon)}, 'distritos': {distrito: (lat, lon)}}
+    con los nombres normalizados. El centro de un distrito pondera sus barrios por área.
+    """
+    barrios, solo_barrio, sumas = {}, {}, {}
+    for feature in (geojson or {}).get('features', []):
+        props = feature.get('properties') or {}
+        area, lon, lat = area_y_centroide(feature.get('geometry') or {})
+        if area <= 0:
+            continue
+        distrito = normalizar_consulta(props.get('neighbourhood_group'))
+        barrio = normalizar_consulta(props.get('neighbourhood'))
+        barrios[(distrito, barrio)] = (lat, lon)
+        solo_barrio.setdefault(barrio, (lat, lon))
+        a, slat, slon = sumas.get(distrito, (0.0, 0.0, 0.0))
+        sumas[distrito] = (a + area, slat + area * lat, slon + area * lon)
+
+    distritos = {d: (slat / a, slon / a) for d, (a, slat, slon) in sumas.items() if d}
+    return {"barrios": barrios, "solo_barrio": solo_barrio, "distritos": distritos}
+
+
+def buscar_en_nomenclator(nomenclator, distrito, barrio):
+    """(lat, lon) del barrio (o del distrito si el barrio no aparece en el GeoJSON), o None."""
+    distrito, barrio = normalizar_consulta(distrito), normalizar_consulta(barrio)
+    return (
+        nomenclator["barrios"].get((distrito, barrio))
+        or nomenclator["solo_barrio"].get(barrio)
+        or nomenclator["distritos"].get(distrito)
+    )
@@ -0,0 +1,52 @@
+"""
+Coste de un rerun de cada pantalla de app.py, sin navegador (Streamlit AppTest).
+
+El primer run de cada pantalla llena las cachés y no cuenta: se mide lo que paga
+cada interacción después. Para comparar con otra versión de la app, pásala con --app
+(en la misma carpeta, para que encuentre sus módulos).
+
+Uso:
+    python medir_reruns.py --reruns 20
+    python medir_reruns.py --app app_antes.py --pantallas landing host
+"""
+import argparse
+import os
+import statistics
+import time
+
+from streamlit.testing.v1 import AppTest
+
+PANTALLAS = ("landing", "host", "inversor")
+
+
+def medir(app_path, pantalla, reruns):
+    at = AppTest.from_file(app_path, default_timeout=120)
+    at.session_state["pantalla_actual"] = pantalla
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"{pantalla}: {at.exception[0].message}")
+
+    tiempos = []
+    for _ in range(reruns):
+        inicio = time.perf_counter()
+        at.run()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo por rerun de cada pantalla de la app de Streamlit")
+    parser.add_argument("--app", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"))
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--pantallas", nargs="+", choices=PANTALLAS, default=["landing", "host"])
+    args = parser.parse_args()
+
+    print(f"📊 {args.app} ({args.reruns} reruns por pantalla)")
+    for pantalla in args.pantallas:
+        tiempos = medir(args.app, pantalla, args.reruns)
+        p95 = sorted(tiempos)[min(int(len(tiempos) * 0.95), len(tiempos) - 1)]
+        print(f"   {pantalla:<9} media {statistics.mean(tiempos):7.1f} ms | p50 {statistics.median(tiempos):7.1f} ms | p95 {p95:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()